@@ -3,21 +3,11 @@ import os
 import logging
 import sys
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
-def filter_json_files():
+def filter_json_files(json_dir='data/pulte/json', html_dir='data/pulte/html'):
     """过滤并删除homeplans和homesites都为空的JSON文件"""
     try:
-        # 指定JSON文件目录
-        json_dir = 'data/pulte/json'
         
         # 确保目录存在
         if not os.path.exists(json_dir):
@@ -47,7 +37,7 @@ def filter_json_files():
                     
                     # 同时删除对应的HTML文件
                     html_filename = filename.replace('.json', '.html')
-                    html_path = os.path.join('data/pulte/html', html_filename)
+                    html_path = os.path.join(html_dir, html_filename)
                     if os.path.exists(html_path):
                         os.remove(html_path)
                         logger.info(f"删除对应的HTML文件: {html_filename}")
@@ -70,4 +60,12 @@ def filter_json_files():
         logger.exception("详细错误信息：")
 
 if __name__ == "__main__":
+    # 配置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
     filter_json_files() 
\ No newline at end of file
@@ -1,53 +1,35 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 import json
 import time
 import logging
 import os
 import sys
+import pulte_driver
+from pulte_driver import quit_driver
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-sys.stdout.reconfigure(encoding='utf-8')  # 设置标准输出编码为UTF-8
 logger = logging.getLogger(__name__)
 
+# 站点根地址，回放/压测时指向本地回放服务器
+BASE_URL = os.environ.get('PULTE_BASE_URL', 'https://www.pulte.com')
+
 def setup_driver():
     """设置Chrome驱动"""
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-    chrome_options.page_load_strategy = 'eager'
-    return webdriver.Chrome(options=chrome_options)
+    return pulte_driver.setup_driver(page_load_strategy='eager')
 
-def get_initial_links():
-    """获取初始链接列表"""
-    url = "https://www.pulte.com/"
+def get_initial_links(html_dir='data'):
+    """获取初始链接列表，首页HTML保存到html_dir"""
+    url = f"{BASE_URL}/"
     driver = setup_driver()
     initial_links = []
     
     try:
         logger.info("开始获取初始页面...")
         driver.get(url)
-        wait = WebDriverWait(driver, 30)
-        time.sleep(5)
+        time.sleep(pulte_driver.PAGE_SETTLE_SECONDS)
         
         # 保存初始页面HTML
-        os.makedirs('data', exist_ok=True)
-        with open('data/pulte_initial.html', 'w', encoding='utf-8') as f:
+        os.makedirs(html_dir, exist_ok=True)
+        with open(os.path.join(html_dir, 'pulte_initial.html'), 'w', encoding='utf-8') as f:
             f.write(driver.page_source)
         logger.info("初始页面HTML已保存")
         
@@ -63,7 +45,7 @@ def get_initial_links():
             for a in ul.find_all('a', href=True):
                 href = a['href']
                 if not href.startswith('http'):
-                    href = 'https://www.pulte.com' + href
+                    href = BASE_URL + href
                 if '/homes/' in href.lower() and href not in state_links:
                     state_links.append(href)
                     logger.info(f"方法1找到州链接: {href}")
@@ -73,7 +55,7 @@ def get_initial_links():
         for link in all_links:
             href = link['href']
             if not href.startswith('http'):
-                href = 'https://www.pulte.com' + href
+                href = BASE_URL + href
             if href not in state_links:
                 state_links.append(href)
                 logger.info(f"方法2找到州链接: {href}")
@@ -86,10 +68,10 @@ def get_initial_links():
         logger.error(f"获取初始链接时出错: {str(e)}")
         return []
     finally:
-        driver.quit()
+        quit_driver(driver)
 
-def get_community_links(initial_links):
-    """从初始链接获取社区链接"""
+def get_community_links(initial_links, html_dir='data'):
+    """从初始链接获取社区链接，各列表页HTML保存到html_dir"""
     driver = setup_driver()
     community_links = []
     
@@ -98,11 +80,11 @@ def get_community_links(initial_links):
             logger.info(f"处理链接: {url}")
             try:
                 driver.get(url)
-                time.sleep(5)
+                time.sleep(pulte_driver.PAGE_SETTLE_SECONDS)
                 
                 # 保存每个页面的HTML（使用URL的最后部分作为文件名）
                 filename = url.rstrip('/').split('/')[-1] or 'index'
-                with open(f'data/pulte_{filename}.html', 'w', encoding='utf-8') as f:
+                with open(os.path.join(html_dir, f'pulte_{filename}.html'), 'w', encoding='utf-8') as f:
                     f.write(driver.page_source)
                 
                 # 解析页面获取社区链接
@@ -116,7 +98,7 @@ def get_community_links(initial_links):
                         href = a_tag.get('data-href') or a_tag.get('href')
                         if href:
                             if not href.startswith('http'):
-                                href = 'https://www.pulte.com' + href
+                                href = BASE_URL + href
                             if href not in community_links:
                                 community_links.append(href)
                                 logger.info(f"方法1找到社区链接: {href}")
@@ -129,7 +111,7 @@ def get_community_links(initial_links):
                         href = a_tag.get('href')
                         if href and '/homes/' in href.lower():
                             if not href.startswith('http'):
-                                href = 'https://www.pulte.com' + href
+                                href = BASE_URL + href
                             if href not in community_links:
                                 community_links.append(href)
                                 logger.info(f"方法2找到社区链接: {href}")
@@ -143,7 +125,7 @@ def get_community_links(initial_links):
         logger.error(f"获取社区链接时出错: {str(e)}")
         return []
     finally:
-        driver.quit()
+        quit_driver(driver)
 
 def is_valid_link(url):
     """检查链接是否以数字结尾"""
@@ -154,10 +136,10 @@ def is_valid_link(url):
     # 检查最后一个字符是否是数字
     return last_part[-1].isdigit() if last_part else False
 
-def main():
+def main(output_file='pulte_links.json', html_dir='data'):
     try:
         # 获取初始链接
-        initial_links = get_initial_links()
+        initial_links = get_initial_links(html_dir)
         logger.info(f"找到 {len(initial_links)} 个初始链接")
         
         if not initial_links:
@@ -165,7 +147,7 @@ def main():
             return
         
         # 获取社区链接
-        community_links = get_community_links(initial_links)
+        community_links = get_community_links(initial_links, html_dir)
         logger.info(f"找到 {len(community_links)} 个社区链接")
         
         if not community_links:
@@ -177,12 +159,21 @@ def main():
         logger.info(f"过滤后剩余 {len(filtered_links)} 个有效链接")
         
         # 保存链接到JSON文件
-        with open('pulte_links.json', 'w', encoding='utf-8') as f:
+        with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(filtered_links, f, indent=2, ensure_ascii=False)
-        logger.info("链接已保存到 pulte_links.json")
+        logger.info(f"链接已保存到 {output_file}")
         
     except Exception as e:
         logger.error(f"主程序执行出错: {str(e)}")
 
 if __name__ == "__main__":
+    # 配置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    sys.stdout.reconfigure(encoding='utf-8')  # 设置标准输出编码为UTF-8
     main() 
\ No newline at end of file
@@ -1,8 +1,3 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from bs4 import BeautifulSoup
 import json
 import time
@@ -13,28 +8,74 @@ from datetime import datetime
 import re
 import argparse
 import os.path
-global_url=""
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
+from pulte_driver import (
+    ManagedDriver, ArchiveDriver, Deadline, CommunityTimeout, NavigationTimeout,
+    reap_orphaned_drivers, COMMUNITY_TIMEOUT
 )
+from pulte_writer import OutputWriter, SyncWriter, cleanup_partial_writes, WRITER_QUEUE_SIZE
+from pulte_throttle import (
+    AdaptiveController, run_adaptive_batch,
+    OUTCOME_OK, OUTCOME_SKIPPED, OUTCOME_EMPTY, OUTCOME_TIMEOUT, OUTCOME_BLOCKED, OUTCOME_ERROR,
+    FAILURE_OUTCOMES
+)
+from pulte_scheduler import CrawlHistory
+from pulte_changes import ChangeFeed
+from pulte_queue import open_queue, run_worker, LEASE_SECONDS
+from pulte_scriptdata import ScriptDataIndex, SCRIPT_RE
+from pulte_memory import PeakRSS, SubtreeStrainer, class_tokens
+
 logger = logging.getLogger(__name__)
 
-def setup_driver():
-    """设置Chrome驱动"""
-    chrome_options = Options()
-    chrome_options.add_argument('--headless')
-    chrome_options.add_argument('--disable-gpu')
-    chrome_options.add_argument('--no-sandbox')
-    chrome_options.add_argument('--disable-dev-shm-usage')
-    chrome_options.add_argument('--window-size=1920,1080')
-    chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-    return webdriver.Chrome(options=chrome_options)
+# 站点根地址，回放/压测时指向本地回放服务器
+BASE_URL = os.environ.get('PULTE_BASE_URL', 'https://www.pulte.com')
+
+# 拦截/验证页面的特征文本
+BLOCK_PAGE_MARKERS = [
+    'access denied',
+    'request unsuccessful',
+    'pardon our interruption',
+    'attention required',
+    'just a moment',
+    'are you a robot',
+    'captcha',
+]
+
+class BlockedPage(Exception):
+    """命中网站的拦截或验证页面"""
+
+class EmptyPage(Exception):
+    """页面缺少户型信息(GlanceViewSection)"""
+
+def is_blocked_page(soup):
+    """判断页面是否为拦截或验证页面"""
+    title = soup.title.text.strip().lower() if soup.title else ''
+    if any(marker in title for marker in BLOCK_PAGE_MARKERS):
+        return True
+    # 正常的社区页面一定有h1，拦截页通常只有很短的正文
+    if not soup.find('h1'):
+        body_text = soup.body.get_text(' ', strip=True).lower()[:2000] if soup.body else ''
+        return any(marker in body_text for marker in BLOCK_PAGE_MARKERS)
+    return False
+
+def community_subtree(name, attrs):
+    """低内存模式下社区页需要解析的子树：标题、h1、电话链接，以及图片/价格/地址/描述/配套/户型列表所在的div"""
+    if name in ('title', 'h1'):
+        return True
+    if name == 'a':
+        return 'tel:' in (dict(attrs or {}).get('href') or '')
+    if name != 'div':
+        return False
+    return any(token in ('owl-item', 'neighborhood-features-container', 'description', 'GlanceViewSection')
+               or 'price' in token.lower() or 'address' in token.lower()
+               for token in class_tokens(attrs))
+
+def homesite_subtree(name, attrs):
+    """低内存模式下户型页需要解析的子树：地址、概述、楼层平面图和图片轮播"""
+    if name != 'div':
+        return False
+    return any(token in ('CommunityPersistentNav__address', 'floor-container', 'owl-stage')
+               or 'description' in token.lower() or 'overview' in token.lower()
+               for token in class_tokens(attrs))
 
 def extract_price(text):
     """从文本中提取价格"""
@@ -60,40 +101,96 @@ def extract_sqft(text):
     sqft_match = re.search(r'([\d,]+)\s*sq\s*ft', text.lower())
     return sqft_match.group(1).replace(',', '') if sqft_match else None
 
-def fetch_page(url, output_dir='data/pulte'):
-    """获取页面数据并解析"""
+def scan_script_coordinates(html):
+    """内嵌数据中没有经纬度时，查找包含经纬度的script标签，取第一个匹配"""
+    for _, script_text in SCRIPT_RE.findall(html):
+        lat_match = re.search(r'latitude["\s:]+([-\d.]+)', script_text)
+        lng_match = re.search(r'longitude["\s:]+([-\d.]+)', script_text)
+        if lat_match and lng_match:
+            return float(lat_match.group(1)), float(lng_match.group(1))
+    return None, None
+
+def existing_nearbyplaces(json_file):
+    """已有社区JSON中的nearbyplaces，读取失败时返回空列表"""
+    try:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('nearbyplaces') or []
+    except Exception as e:
+        logger.error(f"读取已有nearbyplaces失败 {json_file}: {str(e)}")
+        return []
+
+def fetch_page(url, output_dir='data/pulte', community_timeout=COMMUNITY_TIMEOUT, writer=None,
+               raise_errors=False, force=False, low_memory=False, driver_factory=None, save_html=True):
+    """获取页面数据并解析
+
+    writer为None时在当前线程同步写文件，传入OutputWriter时由后台写入阶段完成。
+    raise_errors为True时异常向上抛出，且缺少GlanceViewSection的页面不写JSON。
+    force为True时即使JSON已存在也重新抓取（刷新模式）；此时缺少GlanceViewSection的页面
+    同样不写JSON，避免加载不完整的页面覆盖已有的数据。
+    low_memory为True时只为用到的子树建立解析树（见community_subtree/homesite_subtree），并在字段提取完后立即释放。
+    driver_factory用于创建取页面的driver，默认ManagedDriver；重新解析归档时传入ArchiveDriver，
+    并以save_html=False避免重复写出HTML。
+    """
+    driver_factory = driver_factory or ManagedDriver
+    writer = writer or SyncWriter()
+    driver = None
+    homesite_driver = None
+    community_mem = None
     try:
         # 生成输出文件名
         community_name = url.split('/')[-1]
+        community_id_match = re.search(r'(\d+)$', community_name)
+        community_id = community_id_match.group(1) if community_id_match else None
         json_file = f"{output_dir}/json/pulte_{community_name}.json"
         
         # 检查文件是否已存在
-        if os.path.exists(json_file):
+        if not force and os.path.exists(json_file):
             logger.info(f"JSON文件已存在: {json_file}, 跳过处理...")
             return None
             
         logger.info(f"正在处理URL: {url}")
-        driver = setup_driver()
-        driver.get(url)
-        time.sleep(5)  # 等待页面加载
-        global global_url
-        global_url=url
+        deadline = Deadline(community_timeout)
+        driver = driver_factory()
+        page_source = driver.open(url, deadline)
+        driver.quit()  # 社区页面已取回，尽早释放浏览器
         
+        community_mem = PeakRSS(f"社区页 {community_name}").start()
+
+        # 解析页面内嵌的JSON/JSON-LD数据，经纬度、地址、价格优先从这里取
+        # 需要完整的<script>内容，因此在剪枝之前完成
+        script_index = ScriptDataIndex(page_source)
+        latitude, longitude = script_index.coordinates(community_id)
+        indexed_location = script_index.location()
+        indexed_price = script_index.price()
+        indexed_address = script_index.address(community_id)
+        del script_index  # 社区页需要的内嵌字段已取出，在构建解析树之前释放索引
+        if latitude is None:
+            latitude, longitude = scan_script_coordinates(page_source)
+
+        # 解析数据
+        if low_memory:
+            soup = BeautifulSoup(page_source, 'html.parser', parse_only=SubtreeStrainer(community_subtree))
+            # 没有h1时可能是拦截页，判断需要正文；拦截页很小，完整解析一次
+            blocked = is_blocked_page(soup if soup.find('h1') else BeautifulSoup(page_source, 'html.parser'))
+        else:
+            soup = BeautifulSoup(page_source, 'html.parser')
+            blocked = is_blocked_page(soup)
+        if blocked:
+            raise BlockedPage(f"命中拦截页面: {url}")
+
         # 保存HTML
         os.makedirs(f"{output_dir}/html", exist_ok=True)
         os.makedirs(f"{output_dir}/json", exist_ok=True)
         html_file = f"{output_dir}/html/pulte_{community_name}.html"
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(driver.page_source)
-        logger.info(f"HTML已保存到: {html_file}")
+        if save_html:
+            writer.write_text(html_file, page_source)
+        del page_source  # 之后只使用解析树，原始HTML交给写入阶段
 
-        # 解析数据
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
         data = {
             "timestamp": datetime.now().isoformat(),
             "name": soup.find('h1').text.strip() if soup.find('h1') else None,
             "status": None,
-            "url": global_url,
+            "url": url,
             "price_from": None,
             "address": None,
             "phone": None,
@@ -144,26 +241,18 @@ def fetch_page(url, output_dir='data/pulte'):
 
         logger.info(f"总共提取到 {len(data['images'])} 张图片")
 
-        # 提取经纬度
-        # 查找包含经纬度的script标签
-        scripts = soup.find_all('script')
-        for script in scripts:
-            if script.string:
-                # 查找latitude
-                lat_match = re.search(r'latitude["\s:]+([-\d.]+)', script.string)
-                if lat_match:
-                    data["location"]["latitude"] = float(lat_match.group(1))
-
-                # 查找longitude
-                lng_match = re.search(r'longitude["\s:]+([-\d.]+)', script.string)
-                if lng_match:
-                    data["location"]["longitude"] = float(lng_match.group(1))
+        # 经纬度
+        data["location"]["latitude"] = latitude
+        data["location"]["longitude"] = longitude
+        data["location"]["address"] = indexed_location
 
         # 提取基本信息
         # 价格信息
-        price_elem = soup.find('div', class_=lambda x: x and 'price' in x.lower())
-        if price_elem:
-            data["price_from"] = extract_price(price_elem.text)
+        data["price_from"] = indexed_price
+        if not data["price_from"]:
+            price_elem = soup.find('div', class_=lambda x: x and 'price' in x.lower())
+            if price_elem:
+                data["price_from"] = extract_price(price_elem.text)
 
         # 提取amenities信息
         neighborhood_container = soup.find('div', class_='neighborhood-features-container')
@@ -211,9 +300,11 @@ def fetch_page(url, output_dir='data/pulte'):
         logger.info(f"总共提取到 {len(data['amenities'])} 个amenities")
 
         # 地址信息
-        address_elem = soup.find('div', class_=lambda x: x and 'address' in x.lower())
-        if address_elem:
-            data["address"] = address_elem.text.strip()
+        data["address"] = indexed_address
+        if not data["address"]:
+            address_elem = soup.find('div', class_=lambda x: x and 'address' in x.lower())
+            if address_elem:
+                data["address"] = address_elem.text.strip()
 
         # 电话信息
         phone_elem = soup.find('a', href=lambda x: x and 'tel:' in x)
@@ -237,6 +328,10 @@ def fetch_page(url, output_dir='data/pulte'):
             home_titles = soup.find_all('div', class_='HomeDesignCompactListView__homeTitle')
             logger.info(f"找到 {len(home_titles)} 个HomeDesignCompactListView__homeTitle元素")
 
+            # 所有homesite共用一个受监管的driver，超时后自动替换
+            homesite_driver = driver_factory()
+            pending_homesites = []
+
             for title_elem in home_titles:
                 a_tag = title_elem.find('a')
                 if a_tag:
@@ -248,7 +343,7 @@ def fetch_page(url, output_dir='data/pulte'):
                     if parent_elem:
                         plan = {
                             "name": a_tag.text.strip(),
-                            "url": f"https://www.pulte.com{a_tag['href']}" if a_tag.get('href') else None,
+                            "url": f"{BASE_URL}{a_tag['href']}" if a_tag.get('href') else None,
                             "details": {
                                 "price": None,
                                 "beds": None,
@@ -318,7 +413,7 @@ def fetch_page(url, output_dir='data/pulte'):
                                     if img_src.startswith('//'):
                                         img_src = f"https:{img_src}"
                                     elif not img_src.startswith('http'):
-                                        img_src = f"https://www.pulte.com{img_src}"
+                                        img_src = f"{BASE_URL}{img_src}"
                                     plan["details"]["image_url"] = img_src
                                     logger.info(f"找到图片URL: {plan['details']['image_url']}")
                                 else:
@@ -359,144 +454,154 @@ def fetch_page(url, output_dir='data/pulte'):
                             homesite['id'] = id_match.group(1)
                             logger.info(f"从URL提取到ID: {homesite['id']}")
                         else:
-                            homesite['id'] = str(len(data['homesites']) + 1)
+                            homesite['id'] = str(len(pending_homesites) + 1)
                             logger.info(f"使用索引作为ID: {homesite['id']}")
 
-                        # 访问homesite的URL获取额外信息
-                        try:
-                            logger.info(f"正在获取homesite额外信息: {homesite['url']}")
-                            # 创建新的driver实例
-                            homesite_driver = setup_driver()
-                            homesite_driver.get(homesite['url'])
-                            time.sleep(5)  # 等待页面加载
-
-                            # 保存HTML
-                            plan_name = homesite['url'].split('/')[-1]
-                            html_file = f"{output_dir}/html/pulte_{plan_name}.html"
-                            with open(html_file, 'w', encoding='utf-8') as f:
-                                f.write(homesite_driver.page_source)
-                            logger.info(f"Homesite HTML已保存到: {html_file}")
-
-                            # 解析HTML
-                            homesite_soup = BeautifulSoup(homesite_driver.page_source, 'html.parser')
-
-                            # 提取地址
-                            address_elem = homesite_soup.find('div', class_='CommunityPersistentNav__address')
-                            if address_elem:
-                                full_address = address_elem.text.strip()
-                                # 移除邮编（假设邮编在最后并且是5位数字）
-                                homesite['address'] = re.sub(r'\s+\d{5}$', '', full_address)
-                                homesite['name'] = homesite['address'].split(',')[0].strip()  # 取地址的第一部分作为name
-                                logger.info(f"找到homesite地址: {homesite['address']}")
-
-                            # 提取overview
-                            overview_elem = homesite_soup.find('div', class_=lambda x: x and ('description' in x.lower() or 'overview' in x.lower()))
-                            if overview_elem:
-                                homesite['overview'] = overview_elem.text.strip()
-                                logger.info(f"找到homesite概述")
-
-                            # 提取经纬度 - 在整个HTML中搜索
-                            html_content = homesite_driver.page_source
-
-                            # 查找latitude - 匹配 "Latitude":"27.3646311523029" 格式
-                            lat_match = re.search(r'"Latitude"\s*:\s*"([-\d.]+)"', html_content)
-                            if not lat_match:
-                                # 尝试其他可能的格式
-                                lat_match = re.search(r'latitude["\s:]+([-\d.]+)', html_content)
-
-                            if lat_match:
-                                homesite["latitude"] = float(lat_match.group(1))
-                                logger.info(f"找到latitude: {homesite['latitude']}")
-                            else:
-                                logger.warning("未找到latitude")
-
-                            # 查找longitude - 匹配 "Longitude":"-82.3959473004829" 格式
-                            lng_match = re.search(r'"Longitude"\s*:\s*"([-\d.]+)"', html_content)
-                            if not lng_match:
-                                # 尝试其他可能的格式
-                                lng_match = re.search(r'longitude["\s:]+([-\d.]+)', html_content)
-
-                            if lng_match:
-                                homesite["longitude"] = float(lng_match.group(1))
-                                logger.info(f"找到longitude: {homesite['longitude']}")
-                            else:
-                                logger.warning("未找到longitude")
-
-                            # 提取楼层平面图
-                            floor_container = homesite_soup.find_all('div', class_='floor-container')
-                            if floor_container:
-                                # 查找所有figure标签下的img
-                                floor_plan_images = []
-                                for idx, figure in enumerate(floor_container, 0):
-                                    floor_images = figure.find("figure")
-                                    logger.info(f"找到 {len(floor_images)} 个floor-container元素")
-                                    img = floor_images.find('img')
-                                    if img:
-                                        # 依次检查data-csrc、data-src和src属性
-                                        img_src = img.get('data-csrc') or img.get('data-src') or img.get('src')
-                                        if img_src:
-                                            # 处理URL前缀
-                                            if img_src.startswith('//'):
-                                                img_src = f"https:{img_src}"
-                                            elif not img_src.startswith('http'):
-                                                img_src = f"https://www.pulte.com{img_src}"
-
-                                            # 创建楼层平面图对象
-                                            floor_plan = {
-                                                "name": f"{idx+1}{'st' if idx == 0 else 'nd' if idx == 1 else 'rd' if idx == 2 else 'th'} Floor Floorplan",
-                                                "url": img_src
-                                            }
-                                            floor_plan_images.append(floor_plan)
-                                            logger.info(f"添加楼层平面图: {floor_plan['name']}")
-
-                                if floor_plan_images:
-                                    # 在homeplans数组中找到对应的plan并更新
-                                    for p in data["homeplans"]:
-                                        if p["name"] == homesite["plan"]:
-                                            p["floorplan_images"] = floor_plan_images
-                                            logger.info(f"更新plan '{p['name']}'的floorplan_images数组，共{len(floor_plan_images)}个楼层平面图")
-                                            break
-                            else:
-                                logger.warning("未找到floor-container元素")
-
-                            # 提取图片数组
-                            owl_stage = homesite_soup.find('div', class_='owl-stage')
-                            if owl_stage:
-                                owl_items = owl_stage.find_all('div', class_='owl-item')
-                                logger.info(f"找到 {len(owl_items)} 个owl-item元素")
-
-                                for item in owl_items:
-                                    img = item.find('img')
-                                    if img and img.get('data-csrc'):
-                                        img_src = img['data-csrc']
-                                        # 处理URL前缀
-                                        if img_src.startswith('//'):
-                                            img_src = f"https:{img_src}"
-                                        elif not img_src.startswith('http'):
-                                            img_src = f"https://www.pulte.com{img_src}"
-                                        homesite["images"].append(img_src)
-                                        logger.info(f"添加图片URL到images数组: {img_src}")
-                                    elif img and img.get('data-src'):
-                                        img_src = img['data-src']
-                                        # 处理URL前缀
-                                        if img_src.startswith('//'):
-                                            img_src = f"https:{img_src}"
-                                        elif not img_src.startswith('http'):
-                                            img_src = f"https://www.pulte.com{img_src}"
-                                        homesite["images"].append(img_src)
-                                        logger.info(f"添加图片URL到images数组: {img_src}")
-                            else:
-                                logger.warning("未找到owl-stage元素")
-
-                            logger.info(f"总共提取到 {len(homesite['images'])} 张图片")
-
-                            homesite_driver.quit()
-
-                        except Exception as e:
-                            logger.error(f"获取homesite额外信息时出错: {str(e)}")
-
-                        data["homesites"].append(homesite)
-                        logger.info(f"添加homesite for plan: {homesite['plan']}")
+                        pending_homesites.append(homesite)
+
+            # 列表页字段已全部提取，低内存模式下先释放社区页的解析树，再逐个访问户型页
+            if low_memory:
+                soup.decompose()
+                del soup, home_titles, glance_section
+            community_mem.stop()
+
+            for homesite in pending_homesites:
+                # 访问homesite的URL获取额外信息
+                homesite_mem = None
+                try:
+                    logger.info(f"正在获取homesite额外信息: {homesite['url']}")
+                    homesite_html = homesite_driver.open(homesite['url'], deadline)
+
+                    # 保存HTML
+                    plan_name = homesite['url'].split('/')[-1]
+                    html_file = f"{output_dir}/html/pulte_{plan_name}.html"
+                    if save_html:
+                        writer.write_text(html_file, homesite_html)
+
+                    # 解析HTML
+                    homesite_mem = PeakRSS(f"户型页 {plan_name}").start()
+                    homesite_index = ScriptDataIndex(homesite_html)
+                    homesite_soup = BeautifulSoup(homesite_html, 'html.parser',
+                                                  parse_only=SubtreeStrainer(homesite_subtree) if low_memory else None)
+                    del homesite_html
+
+                    # 户型属性：内嵌数据中有的键优先，其余保留列表页的值
+                    for key, value in homesite_index.plan_attributes().items():
+                        if value:
+                            homesite[key] = value
+
+                    # 提取地址
+                    full_address = homesite_index.address(community_id)
+                    if not full_address:
+                        address_elem = homesite_soup.find('div', class_='CommunityPersistentNav__address')
+                        full_address = address_elem.text.strip() if address_elem else None
+                    if full_address:
+                        # 移除邮编（假设邮编在最后并且是5位数字）
+                        homesite['address'] = re.sub(r'\s+\d{5}$', '', full_address)
+                        homesite['name'] = homesite['address'].split(',')[0].strip()  # 取地址的第一部分作为name
+                        logger.info(f"找到homesite地址: {homesite['address']}")
+
+                    # 提取overview
+                    overview_elem = homesite_soup.find('div', class_=lambda x: x and ('description' in x.lower() or 'overview' in x.lower()))
+                    if overview_elem:
+                        homesite['overview'] = overview_elem.text.strip()
+                        logger.info(f"找到homesite概述")
+
+                    # 提取经纬度 - 只采用属于本社区的内嵌数据，
+                    # 户型页上其他社区/全站地图的坐标不可靠，没有时沿用社区坐标
+                    latitude, longitude = homesite_index.coordinates(community_id, strict=True)
+                    if latitude is None:
+                        latitude = data["location"]["latitude"]
+                        longitude = data["location"]["longitude"]
+                        logger.info("户型页没有本社区的坐标，使用社区坐标")
+                    homesite["latitude"] = latitude
+                    homesite["longitude"] = longitude
+                    logger.info(f"homesite坐标: {latitude}, {longitude}")
+
+                    # 提取楼层平面图
+                    floor_container = homesite_soup.find_all('div', class_='floor-container')
+                    if floor_container:
+                        # 查找所有figure标签下的img
+                        floor_plan_images = []
+                        for idx, figure in enumerate(floor_container, 0):
+                            floor_images = figure.find("figure")
+                            logger.info(f"找到 {len(floor_images)} 个floor-container元素")
+                            img = floor_images.find('img')
+                            if img:
+                                # 依次检查data-csrc、data-src和src属性
+                                img_src = img.get('data-csrc') or img.get('data-src') or img.get('src')
+                                if img_src:
+                                    # 处理URL前缀
+                                    if img_src.startswith('//'):
+                                        img_src = f"https:{img_src}"
+                                    elif not img_src.startswith('http'):
+                                        img_src = f"{BASE_URL}{img_src}"
+
+                                    # 创建楼层平面图对象
+                                    floor_plan = {
+                                        "name": f"{idx+1}{'st' if idx == 0 else 'nd' if idx == 1 else 'rd' if idx == 2 else 'th'} Floor Floorplan",
+                                        "url": img_src
+                                    }
+                                    floor_plan_images.append(floor_plan)
+                                    logger.info(f"添加楼层平面图: {floor_plan['name']}")
+
+                        if floor_plan_images:
+                            # 在homeplans数组中找到对应的plan并更新
+                            for p in data["homeplans"]:
+                                if p["name"] == homesite["plan"]:
+                                    p["floorplan_images"] = floor_plan_images
+                                    logger.info(f"更新plan '{p['name']}'的floorplan_images数组，共{len(floor_plan_images)}个楼层平面图")
+                                    break
+                    else:
+                        logger.warning("未找到floor-container元素")
+
+                    # 提取图片数组
+                    owl_stage = homesite_soup.find('div', class_='owl-stage')
+                    if owl_stage:
+                        owl_items = owl_stage.find_all('div', class_='owl-item')
+                        logger.info(f"找到 {len(owl_items)} 个owl-item元素")
+
+                        for item in owl_items:
+                            img = item.find('img')
+                            if img and img.get('data-csrc'):
+                                img_src = img['data-csrc']
+                                # 处理URL前缀
+                                if img_src.startswith('//'):
+                                    img_src = f"https:{img_src}"
+                                elif not img_src.startswith('http'):
+                                    img_src = f"{BASE_URL}{img_src}"
+                                homesite["images"].append(img_src)
+                                logger.info(f"添加图片URL到images数组: {img_src}")
+                            elif img and img.get('data-src'):
+                                img_src = img['data-src']
+                                # 处理URL前缀
+                                if img_src.startswith('//'):
+                                    img_src = f"https:{img_src}"
+                                elif not img_src.startswith('http'):
+                                    img_src = f"{BASE_URL}{img_src}"
+                                homesite["images"].append(img_src)
+                                logger.info(f"添加图片URL到images数组: {img_src}")
+                    else:
+                        logger.warning("未找到owl-stage元素")
+
+                    logger.info(f"总共提取到 {len(homesite['images'])} 张图片")
+                    if low_memory:
+                        homesite_soup.decompose()
+                    del homesite_soup, homesite_index
+                    homesite_mem.stop()
+
+                except CommunityTimeout:
+                    raise
+                except NavigationTimeout as e:
+                    logger.error(f"获取homesite额外信息超时: {str(e)}")
+                except Exception as e:
+                    logger.error(f"获取homesite额外信息时出错: {str(e)}")
+                finally:
+                    if homesite_mem is not None:
+                        homesite_mem.close()
+
+                data["homesites"].append(homesite)
+                logger.info(f"添加homesite for plan: {homesite['plan']}")
 
             logger.info(f"总共提取到 {len(data['homeplans'])} 个homeplans和 {len(data['homesites'])} 个homesites")
 
@@ -606,38 +711,176 @@ def fetch_page(url, output_dir='data/pulte'):
 
         else:
             logger.warning("未找到GlanceViewSection元素")
+            community_mem.stop()
+            if raise_errors or force:
+                raise EmptyPage(f"未找到GlanceViewSection元素: {url}")
+
+        # nearbyplaces由pulte_spatial在批量结束后计算，重新抓取时沿用已有JSON中的值
+        if os.path.exists(json_file):
+            data["nearbyplaces"] = existing_nearbyplaces(json_file)
 
-        # 保存JSON
-        with open(json_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        logger.info(f"数据已保存到: {json_file}")
+        # 保存JSON；等待写入完成，写入失败按处理失败返回，调用方不会据此更新抓取历史和变化事件
+        writer.write_json(json_file, data).result()
 
         return data
 
+    except (CommunityTimeout, NavigationTimeout) as e:
+        logger.error(f"处理页面超时: {str(e)}")
+        if raise_errors:
+            raise
+        return None
     except Exception as e:
         logger.error(f"处理页面时出错: {str(e)}")
+        if raise_errors:
+            raise
         return None
     finally:
-        driver.quit()
-
-def main():
+        if community_mem is not None:
+            community_mem.close()  # 异常路径上未stop的测量，避免之后的测量都被当作并发
+        if driver is not None:
+            driver.quit()
+        if homesite_driver is not None:
+            homesite_driver.quit()
+
+def classify_error(error):
+    """把fetch_page抛出的异常映射为OUTCOME_*"""
+    if isinstance(error, (CommunityTimeout, NavigationTimeout)):
+        return OUTCOME_TIMEOUT
+    if isinstance(error, BlockedPage):
+        return OUTCOME_BLOCKED
+    if isinstance(error, EmptyPage):
+        return OUTCOME_EMPTY
+    return OUTCOME_ERROR
+
+def fetch_outcome(url, output_dir='data/pulte', community_timeout=COMMUNITY_TIMEOUT, writer=None,
+                  force=False, history=None, low_memory=False, changes=None):
+    """抓取一个社区并返回结果分类，供自适应控制器使用"""
+    started = time.monotonic()
+    data = None
+    outcome = OUTCOME_ERROR
+    try:
+        data = fetch_page(url, output_dir, community_timeout, writer, raise_errors=True, force=force,
+                          low_memory=low_memory)
+        if data is not None and history is not None:
+            history.record(url, data, time.monotonic() - started)
+        if data is not None and changes is not None:
+            changes.observe(url, data)
+        outcome = OUTCOME_SKIPPED if data is None else OUTCOME_OK
+    except Exception as e:
+        outcome = classify_error(e)
+    finally:
+        reap_orphaned_drivers()
+    if outcome == OUTCOME_EMPTY and history is not None:
+        history.record_empty(url, time.monotonic() - started)
+    elif outcome in FAILURE_OUTCOMES and history is not None:
+        history.record(url, None, time.monotonic() - started)
+    return outcome
+
+def archived_community_urls(output_dir='data/pulte', links_file=None):
+    """有归档HTML的社区URL；URL取自已有JSON和链接列表，homesite页面的HTML不在其中"""
+    urls = {}
+    if links_file and os.path.exists(links_file):
+        with open(links_file, 'r', encoding='utf-8') as f:
+            for url in json.load(f):
+                urls[url.rstrip('/').split('/')[-1]] = url
+    json_dir = f"{output_dir}/json"
+    if os.path.isdir(json_dir):
+        for name in sorted(os.listdir(json_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                    url = json.load(f).get('url')
+            except Exception as e:
+                logger.error(f"读取 {name} 时出错: {str(e)}")
+                continue
+            if url:
+                urls.setdefault(url.rstrip('/').split('/')[-1], url)
+    archive = ArchiveDriver(f"{output_dir}/html")
+    return [url for url in urls.values() if os.path.exists(archive.path_for(url))]
+
+
+def reparse_archive(output_dir='data/pulte', writer=None, links_file=None, low_memory=False):
+    """不启动浏览器，用归档的HTML重新生成所有社区JSON，返回成功解析的社区数"""
+    writer = writer or SyncWriter()
+    urls = archived_community_urls(output_dir, links_file)
+    logger.info(f"找到 {len(urls)} 个有归档HTML的社区")
+    parsed = 0
+    for i, url in enumerate(urls, 1):
+        logger.info(f"重新解析第 {i}/{len(urls)} 个社区")
+        data = fetch_page(url, output_dir, None, writer, force=True, low_memory=low_memory,
+                          driver_factory=lambda: ArchiveDriver(f"{output_dir}/html"), save_html=False)
+        if data is not None:
+            parsed += 1
+    writer.flush()
+    logger.info(f"重新解析完成: {parsed}/{len(urls)}")
+    return parsed
+
+
+def main(argv=None):
     """主函数"""
+    writer = None
     try:
         # 解析命令行参数
         parser = argparse.ArgumentParser(description='Scrape Pulte community pages')
         parser.add_argument('--batch', action='store_true', help='Process all URLs from pulte_links.json')
         parser.add_argument('--url', help='Process a single URL')
-        args = parser.parse_args()
+        parser.add_argument('--community-timeout', type=float, default=COMMUNITY_TIMEOUT, help='Time budget in seconds for one community and its homesites')
+        parser.add_argument('--writer-queue', type=int, default=WRITER_QUEUE_SIZE, help='Max pending files in the background writer queue')
+        parser.add_argument('--compact-json', action='store_true', help='Write JSON without indentation')
+        parser.add_argument('--adaptive', action='store_true', help='Crawl the batch concurrently under the adaptive controller')
+        parser.add_argument('--min-concurrency', type=int, default=1, help='Lower bound for adaptive concurrency')
+        parser.add_argument('--max-concurrency', type=int, default=4, help='Upper bound for adaptive concurrency')
+        parser.add_argument('--refresh', action='store_true', help='Re-crawl existing communities in change-frequency priority order (implies --batch)')
+        parser.add_argument('--page-budget', type=int, default=None, help='Max pages (community + homesite) to fetch in a refresh run')
+        parser.add_argument('--queue', help='Lease URLs from a shared work queue, e.g. sqlite:///data/pulte/queue.db')
+        parser.add_argument('--worker-id', help='Worker name used for queue leases (default: host-pid)')
+        parser.add_argument('--low-memory', action='store_true', help='Build parse trees only for the page sections that are extracted, and free them early')
+        parser.add_argument('--download-assets', action='store_true', help='After the batch, download images and floorplans into data/pulte/assets')
+        parser.add_argument('--populate-nearby', action='store_true', help='After the batch, fill nearbyplaces from community coordinates')
+        parser.add_argument('--asset-workers', type=int, default=8, help='Concurrent asset downloads')
+        parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS, help='Queue lease duration, renewed by heartbeats')
+        parser.add_argument('--no-changes', action='store_true', help='Do not append to the change feed (data/pulte/changes.jsonl)')
+        parser.add_argument('--output-dir', default='data/pulte', help='Root directory for html/, json/ and crawl state')
+        parser.add_argument('--links-file', help='URL list for --batch (default: search the usual pulte_links.json locations)')
+        parser.add_argument('--detect-removed', action='store_true',
+                            help='The links file is the complete discovery list: emit community_removed for indexed communities missing from it')
+        args = parser.parse_args(argv)
 
         # 确保输出目录存在
-        output_dir = 'data/pulte'
+        output_dir = args.output_dir
         html_dir = f'{output_dir}/html'
         json_dir = f'{output_dir}/json'
         os.makedirs(output_dir, exist_ok=True)
         os.makedirs(html_dir, exist_ok=True)
         os.makedirs(json_dir, exist_ok=True)
+        cleanup_partial_writes(html_dir)
+        cleanup_partial_writes(json_dir)
+        writer = OutputWriter(max_queue=args.writer_queue, compact=args.compact_json)
         
-        if args.batch:
+        if args.queue:
+            # 协作模式：从共享队列租用URL，结果提交回队列
+            work_queue = open_queue(args.queue)
+            reap_orphaned_drivers()
+            # 每个worker进程串行抓取；控制器负责请求间隔、失败退避和拦截后的熔断
+            controller = AdaptiveController(min_concurrency=1, max_concurrency=1)
+            run_worker(
+                work_queue,
+                lambda u: fetch_page(u, output_dir, args.community_timeout, writer, raise_errors=True, force=True,
+                                     low_memory=args.low_memory),
+                worker_id=args.worker_id,
+                lease_seconds=args.lease_seconds,
+                heartbeat_interval=max(args.lease_seconds / 5, 1),
+                controller=controller,
+                classify=classify_error,
+                after_task=reap_orphaned_drivers
+            )
+        elif args.batch or args.refresh:
+            history = CrawlHistory(f'{output_dir}/crawl_history.json')
+            changes = None
+            if not args.no_changes:
+                # 索引不存在时以现有JSON作为上一轮快照
+                changes = ChangeFeed(f'{output_dir}/snapshot_index.json', f'{output_dir}/changes.jsonl', json_dir)
             try:
                 # 检查多个可能的文件位置
                 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -650,8 +893,8 @@ def main():
                     os.path.join(current_dir, 'data/pulte/pulte_links.json')
                 ]
                 
-                json_file = None
-                for path in possible_paths:
+                json_file = args.links_file
+                for path in ([] if json_file else possible_paths):
                     if os.path.exists(path):
                         json_file = path
                         logger.info(f"找到 pulte_links.json 文件位置: {path}")
@@ -670,25 +913,78 @@ def main():
                     return
                 
                 logger.info(f"找到 {len(urls)} 个待处理的URL")
-                
-                # 处理每个URL
-                for i, url in enumerate(urls, 1):
-                    try:
-                        logger.info(f"正在处理第 {i}/{len(urls)} 个URL")
-                        fetch_page(url, output_dir)
-                        time.sleep(2)  # 添加延迟以避免请求过于频繁
-                    except Exception as e:
-                        logger.error(f"处理URL失败 {url}: {str(e)}")
-                        continue
+                # 只有完整的发现列表才能判断下架，部分链接文件会把其余社区都误报为removed
+                if changes is not None and args.detect_removed:
+                    changes.removed(urls)
+                if args.refresh:
+                    urls = history.plan(urls, args.page_budget)
+                reap_orphaned_drivers()
+
+                if args.adaptive:
+                    controller = AdaptiveController(
+                        min_concurrency=args.min_concurrency,
+                        max_concurrency=args.max_concurrency
+                    )
+                    run_adaptive_batch(
+                        urls,
+                        lambda u: fetch_outcome(u, output_dir, args.community_timeout, writer,
+                                                force=args.refresh, history=history,
+                                                low_memory=args.low_memory, changes=changes),
+                        controller
+                    )
+                else:
+                    # 处理每个URL
+                    for i, url in enumerate(urls, 1):
+                        try:
+                            logger.info(f"正在处理第 {i}/{len(urls)} 个URL")
+                            started = time.monotonic()
+                            # 空页面/拦截页面以异常返回，不写JSON、不计入历史和变化事件（与自适应路径一致）
+                            data = fetch_page(url, output_dir, args.community_timeout, writer,
+                                              raise_errors=True, force=args.refresh,
+                                              low_memory=args.low_memory)
+                            if data is not None:
+                                history.record(url, data, time.monotonic() - started)
+                                if changes is not None:
+                                    changes.observe(url, data)
+                            reap_orphaned_drivers()
+                            time.sleep(2)  # 添加延迟以避免请求过于频繁
+                        except (EmptyPage, BlockedPage) as e:
+                            logger.warning(f"页面无效，保留已有数据 {url}: {str(e)}")
+                            if isinstance(e, EmptyPage):
+                                history.record_empty(url, time.monotonic() - started)
+                            else:
+                                history.record(url, None, time.monotonic() - started)
+                            reap_orphaned_drivers()
+                            time.sleep(2)
+                            continue
+                        except Exception as e:
+                            logger.error(f"处理URL失败 {url}: {str(e)}")
+                            history.record(url, None, time.monotonic() - started)
+                            continue
                         
             except Exception as e:
                 logger.error(f"批量处理过程中出错: {str(e)}")
                 logger.exception("详细错误信息：")
                 return
+            finally:
+                history.save()
+                if changes is not None:
+                    changes.save()
+
+            if args.populate_nearby:
+                from pulte_spatial import populate_nearbyplaces
+                writer.flush()  # 确保本轮JSON已全部写出
+                populate_nearbyplaces(json_dir, writer=writer)
+
+            if args.download_assets:
+                # requests只在需要下载资源时加载
+                from pulte_assets import download_assets
+                writer.flush()  # 确保本轮JSON已全部写出
+                download_assets(json_dir, f'{output_dir}/assets', args.asset_workers)
                 
         elif args.url:
             # 处理单个指定的URL
-            fetch_page(args.url, output_dir)
+            fetch_page(args.url, output_dir, args.community_timeout, writer, low_memory=args.low_memory)
         else:
             # 处理单个默认URL
             default_urls = [
@@ -697,11 +993,26 @@ def main():
                 "https://www.pulte.com/homes/florida/fort-myers/estero/verdana-village-210715"
             ]
             default_url = default_urls[0]  # 使用第一个URL作为默认值
-            fetch_page(default_url, output_dir)
+            fetch_page(default_url, output_dir, args.community_timeout, writer, low_memory=args.low_memory)
         
     except Exception as e:
         logger.error(f"主程序执行出错: {str(e)}")
         logger.exception("详细错误信息：")
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None and writer.errors:
+        logger.error(f"有 {writer.errors} 个文件写入失败")
+        return 1
+    return 0
 
 if __name__ == "__main__":
-    main() 
+    # 配置日志
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    sys.exit(main())
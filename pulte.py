@@ -0,0 +1,177 @@
+"""Pulte抓取工具的统一入口
+
+    python pulte.py [全局选项] <discover|crawl|reparse|filter|nearby|export|stats> [子命令选项]
+
+全局选项（数据目录、链接文件、并发数、JSON格式）由所有子命令共享，写在子命令前后均可，也可以用环境变量
+PULTE_DATA_DIR / PULTE_LINKS_FILE / PULTE_WORKERS 设置。selenium、BeautifulSoup、pandas等
+依赖只在需要它们的子命令里导入，filter之类的日常命令不需要加载浏览器相关模块。
+crawl未识别的选项原样传给get_pulte_page，例如 `python pulte.py crawl --batch --adaptive`。
+"""
+import argparse
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging(level='INFO'):
+    logging.basicConfig(
+        level=getattr(logging, level.upper(), logging.INFO),
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    if hasattr(sys.stdout, 'reconfigure'):
+        sys.stdout.reconfigure(encoding='utf-8')  # 设置标准输出编码为UTF-8
+
+
+def cmd_discover(args, extra):
+    import get_pulte_api_links
+    # 发现阶段的列表页与社区HTML分开保存，文件名不会冲突
+    get_pulte_api_links.main(args.links_file, f'{args.data_dir}/discovery')
+
+
+def cmd_crawl(args, extra):
+    import get_pulte_page
+    argv = ['--output-dir', args.data_dir, '--max-concurrency', str(args.workers),
+            '--asset-workers', str(args.workers)]
+    if os.path.exists(args.links_file):
+        argv += ['--links-file', args.links_file]
+    if args.compact_json:
+        argv.append('--compact-json')
+    # 子命令自己的选项放在最后，与共享配置重复时以它为准
+    get_pulte_page.main(argv + extra)
+
+
+def cmd_reparse(args, extra):
+    import get_pulte_page
+    from pulte_writer import OutputWriter, cleanup_partial_writes
+
+    cleanup_partial_writes(f'{args.data_dir}/json')
+    writer = OutputWriter(compact=args.compact_json)
+    try:
+        get_pulte_page.reparse_archive(args.data_dir, writer, args.links_file, args.low_memory)
+    finally:
+        writer.close()
+
+
+def cmd_filter(args, extra):
+    import filter_pulte_links
+    filter_pulte_links.filter_json_files(f'{args.data_dir}/json', f'{args.data_dir}/html')
+
+
+def cmd_nearby(args, extra):
+    from pulte_spatial import populate_nearbyplaces, NEARBY_COUNT, NEARBY_MAX_MILES
+    from pulte_writer import SyncWriter
+    populate_nearbyplaces(f'{args.data_dir}/json',
+                          args.k if args.k is not None else NEARBY_COUNT,
+                          args.max_miles if args.max_miles is not None else NEARBY_MAX_MILES,
+                          SyncWriter(compact=args.compact_json))
+
+
+def cmd_export(args, extra):
+    if not args.queue and not args.csv:
+        logger.error("export需要 --queue 或 --csv")
+        return 2
+    if args.queue:
+        from pulte_queue import open_queue, export_results
+        from pulte_writer import SyncWriter
+        export_results(open_queue(args.queue), args.data_dir, SyncWriter(compact=args.compact_json))
+    if args.csv:
+        from pulte_analytics import load_catalog
+        os.makedirs(args.csv, exist_ok=True)
+        for name, frame in zip(('communities', 'plans', 'homesites'), load_catalog(f'{args.data_dir}/json')):
+            path = os.path.join(args.csv, f'{name}.csv')
+            frame.to_csv(path, index=False)
+            logger.info(f"已导出 {len(frame)} 行到: {path}")
+
+
+def cmd_stats(args, extra):
+    import pandas as pd
+    from pulte_analytics import load_catalog, market_stats, inventory_by_state, price_per_sqft_distribution
+
+    communities, plans, homesites = load_catalog(f'{args.data_dir}/json')
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(market_stats(communities, homesites, args.group_by.split(',')).to_string())
+        print()
+        print(inventory_by_state(homesites).to_string())
+        if args.ppsf:
+            print()
+            print(price_per_sqft_distribution(homesites, args.ppsf).to_string())
+
+
+COMMANDS = {
+    'discover': cmd_discover,
+    'crawl': cmd_crawl,
+    'reparse': cmd_reparse,
+    'filter': cmd_filter,
+    'nearby': cmd_nearby,
+    'export': cmd_export,
+    'stats': cmd_stats,
+}
+
+
+def add_shared_options(parser, suppress=False):
+    """所有子命令共享的选项
+
+    主解析器上带实际默认值；子命令解析器上默认值为SUPPRESS，只有显式给出时才覆盖，
+    因此共享选项写在子命令前后都可以。
+    """
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    parser.add_argument('--data-dir', default=default(os.environ.get('PULTE_DATA_DIR', 'data/pulte')),
+                        help='Root for html/, json/, assets/ and crawl state')
+    parser.add_argument('--links-file', default=default(os.environ.get('PULTE_LINKS_FILE', 'pulte_links.json')),
+                        help='Community URL list written by discover and read by crawl')
+    parser.add_argument('--workers', type=int, default=default(int(os.environ.get('PULTE_WORKERS', 4))),
+                        help='Max crawl concurrency and parallel asset downloads')
+    parser.add_argument('--compact-json', action='store_true', default=default(False),
+                        help='Write JSON without indentation')
+    parser.add_argument('--log-level', default=default('INFO'))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pulte', description='Pulte scraper tools')
+    add_shared_options(parser)
+    shared = argparse.ArgumentParser(add_help=False)
+    add_shared_options(shared, suppress=True)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('discover', parents=[shared], help='Collect community URLs into the links file')
+    # crawl的--help也交给get_pulte_page显示完整选项
+    subparsers.add_parser('crawl', parents=[shared], add_help=False,
+                          help='Scrape communities; other options are passed to get_pulte_page')
+
+    reparse = subparsers.add_parser('reparse', parents=[shared], help='Rebuild JSON from archived HTML without a browser')
+    reparse.add_argument('--low-memory', action='store_true', help='Build parse trees only for the page sections that are extracted')
+
+    subparsers.add_parser('filter', parents=[shared], help='Delete community JSON/HTML with no plans and no homesites')
+
+    nearby = subparsers.add_parser('nearby', parents=[shared], help='Fill nearbyplaces with neighboring communities')
+    nearby.add_argument('--k', type=int, help='Neighbors per community (default 5)')
+    nearby.add_argument('--max-miles', type=float, help='Maximum neighbor distance (default 25)')
+
+    export = subparsers.add_parser('export', parents=[shared], help='Export queue results or the catalog as CSV')
+    export.add_argument('--queue', help='Write results committed to this queue, e.g. sqlite:///data/pulte/queue.db')
+    export.add_argument('--csv', help='Directory for communities.csv, plans.csv and homesites.csv')
+
+    stats = subparsers.add_parser('stats', parents=[shared], help='Per-market price and inventory statistics')
+    stats.add_argument('--group-by', default='state,market', help='Comma separated grouping columns')
+    stats.add_argument('--ppsf', metavar='COLUMN', help='Also print the price-per-sqft distribution by this column')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command != 'crawl':
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    configure_logging(args.log_level)
+    return COMMANDS[args.command](args, extra)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
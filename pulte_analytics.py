@@ -0,0 +1,244 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from pulte_writer import SyncWriter
+
+try:
+    import orjson
+except ImportError:  # orjson是可选依赖
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 与fetch_page中的格式对应: "$498,990" / "3-4 bd" / "2.5 ba" / "1,654+ - 1,869 ft²"
+NUMBER_RANGE_RE = r'(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?'
+SQFT_RANGE_RE = r'(\d{1,3}(?:,\d{3})+|\d+)\+?(?:\s*-\s*(\d{1,3}(?:,\d{3})+|\d+)\+?)?'
+PRICE_RE = r'\$([\d,]+)'
+
+
+def _load_json(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return orjson.loads(raw) if orjson is not None else json.loads(raw.decode('utf-8'))
+
+
+def _url_parts(urls):
+    """/homes/<state>/<market>/<city>/<slug> 拆成列"""
+    parts = urls.fillna('').str.extract(r'/homes/([^/]+)/([^/]+)/([^/]+)/([^/?#]+)')
+    parts.columns = ['state', 'market', 'city', 'slug']
+    return parts
+
+
+def load_catalog(json_dir='data/pulte/json'):
+    """一次性读取所有社区JSON，返回 (communities, plans, homesites) 三个DataFrame
+
+    数值列（价格、卧室、浴室、面积）以向量化方式从文本解析为 *_min / *_max 两列。
+    """
+    community_rows, plan_rows, homesite_rows = [], [], []
+    for name in sorted(os.listdir(json_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            data = _load_json(os.path.join(json_dir, name))
+        except Exception as e:
+            logger.error(f"读取 {name} 时出错: {str(e)}")
+            continue
+        file_slug = name[len('pulte_'):-len('.json')] if name.startswith('pulte_') else name[:-len('.json')]
+        location = data.get('location') or {}
+        community_rows.append({
+            "file_slug": file_slug,
+            "name": data.get('name'),
+            "url": data.get('url'),
+            "price_from": data.get('price_from'),
+            "latitude": location.get('latitude'),
+            "longitude": location.get('longitude'),
+        })
+        for plan in data.get('homeplans') or []:
+            details = plan.get('details') or {}
+            plan_rows.append({
+                "file_slug": file_slug,
+                "plan": plan.get('name'),
+                "price": details.get('price'),
+                "beds": details.get('beds'),
+                "baths": details.get('baths'),
+                "sqft": details.get('sqft'),
+                "status": details.get('status'),
+                "stories": len(plan.get('floorplan_images') or []) or np.nan,
+            })
+        for homesite in data.get('homesites') or []:
+            homesite_rows.append({
+                "file_slug": file_slug,
+                "id": homesite.get('id'),
+                "plan": homesite.get('plan'),
+                "price": homesite.get('price'),
+                "beds": homesite.get('beds'),
+                "baths": homesite.get('baths'),
+                "sqft": homesite.get('sqft'),
+                "status": homesite.get('status'),
+                "latitude": homesite.get('latitude'),
+                "longitude": homesite.get('longitude'),
+            })
+
+    communities = pd.DataFrame(community_rows, columns=[
+        "file_slug", "name", "url", "price_from", "latitude", "longitude"])
+    communities = pd.concat([communities, _url_parts(communities["url"])], axis=1)
+    communities["price_from_value"] = _parse_price(communities["price_from"])
+
+    plans = _with_numbers(pd.DataFrame(plan_rows, columns=[
+        "file_slug", "plan", "price", "beds", "baths", "sqft", "status", "stories"]))
+    homesites = _with_numbers(pd.DataFrame(homesite_rows, columns=[
+        "file_slug", "id", "plan", "price", "beds", "baths", "sqft", "status", "latitude", "longitude"]))
+
+    # 每条户型/homesite带上所属社区的州和市场，便于分组
+    geo = communities[["file_slug", "state", "market", "city"]]
+    plans = plans.merge(geo, on="file_slug", how="left")
+    homesites = homesites.merge(geo, on="file_slug", how="left")
+    logger.info(f"载入 {len(communities)} 个社区, {len(plans)} 个户型, {len(homesites)} 个homesite")
+    return communities, plans, homesites
+
+
+def _parse_price(series):
+    return pd.to_numeric(series.astype('string').str.extract(PRICE_RE)[0].str.replace(',', '', regex=False),
+                         errors='coerce')
+
+
+def _parse_range(series, pattern):
+    """把 'a' 或 'a-b' 形式的文本解析成 (min, max) 两列浮点数"""
+    extracted = series.astype('string').str.extract(pattern)
+    low = pd.to_numeric(extracted[0].str.replace(',', '', regex=False), errors='coerce')
+    high = pd.to_numeric(extracted[1].str.replace(',', '', regex=False), errors='coerce')
+    return low, high.fillna(low)
+
+
+def _with_numbers(frame):
+    frame["price_value"] = _parse_price(frame["price"])
+    frame["beds_min"], frame["beds_max"] = _parse_range(frame["beds"], NUMBER_RANGE_RE)
+    frame["baths_min"], frame["baths_max"] = _parse_range(frame["baths"], NUMBER_RANGE_RE)
+    frame["sqft_min"], frame["sqft_max"] = _parse_range(frame["sqft"], SQFT_RANGE_RE)
+    frame["price_per_sqft"] = frame["price_value"] / frame["sqft_min"]
+    return frame
+
+
+def _format_range(low, high, fmt):
+    if pd.isna(low):
+        return None
+    if low == high:
+        return fmt(low)
+    return f"{fmt(low)}-{fmt(high)}"
+
+
+def community_details(plans, homesites):
+    """按社区计算details范围，格式与fetch_page一致"""
+    grouped = homesites.groupby("file_slug")
+    agg = pd.DataFrame({
+        "price_min": grouped["price_value"].min(),
+        "price_max": grouped["price_value"].max(),
+        "beds_min": grouped["beds_min"].min(),
+        "beds_max": grouped["beds_max"].max(),
+        "baths_min": grouped["baths_min"].min(),
+        "baths_max": grouped["baths_max"].max(),
+        "sqft_min": grouped["sqft_min"].min(),
+        "sqft_max": grouped["sqft_max"].max(),
+    })
+    stories = plans.groupby("file_slug")["stories"].agg(['min', 'max'])
+    agg = agg.join(stories.rename(columns={'min': 'stories_min', 'max': 'stories_max'}), how='left')
+
+    details = {}
+    for slug, row in agg.iterrows():
+        details[slug] = {
+            "price_range": _format_range(row.price_min, row.price_max, lambda v: f"${int(v):,}"),
+            "sqft_range": _format_range(row.sqft_min, row.sqft_max, lambda v: f"{int(v):,}"),
+            "bed_range": _format_range(row.beds_min, row.beds_max, lambda v: str(int(v))),
+            "bath_range": _format_range(row.baths_min, row.baths_max, lambda v: str(float(v))),
+            "stories_range": _format_range(row.stories_min, row.stories_max, lambda v: str(int(v))),
+            "community_count": 1,
+        }
+    return details
+
+
+def market_stats(communities, homesites, by=("state", "market")):
+    """按州/市场汇总：社区数、库存、价格和每平方英尺价格的分布"""
+    by = list(by)
+    grouped = homesites.groupby(by)
+    stats = pd.DataFrame({
+        "homesites": grouped.size(),
+        "price_min": grouped["price_value"].min(),
+        "price_median": grouped["price_value"].median(),
+        "price_max": grouped["price_value"].max(),
+        "ppsf_p25": grouped["price_per_sqft"].quantile(0.25),
+        "ppsf_median": grouped["price_per_sqft"].median(),
+        "ppsf_p75": grouped["price_per_sqft"].quantile(0.75),
+        "sqft_median": grouped["sqft_min"].median(),
+    })
+    stats.insert(0, "communities", communities.groupby(by).size())
+    stats["communities"] = stats["communities"].fillna(0).astype(int)
+    return stats.sort_values("homesites", ascending=False)
+
+
+def inventory_by_state(homesites):
+    """各州的homesite数量和状态分布"""
+    return pd.crosstab(homesites["state"], homesites["status"], margins=True, margins_name="total")
+
+
+def price_per_sqft_distribution(homesites, by="market", bins=(0, 150, 200, 250, 300, 400, 600, np.inf)):
+    """每平方英尺价格的分桶分布，按by分组"""
+    buckets = pd.cut(homesites["price_per_sqft"], bins=list(bins), right=False)
+    return pd.crosstab(homesites[by], buckets)
+
+
+def write_back_details(json_dir, details, writer=None):
+    """把重新计算的details写回社区JSON，只改写有变化的文件"""
+    writer = writer or SyncWriter()
+    changed = 0
+    for slug, new_details in details.items():
+        path = os.path.join(json_dir, f"pulte_{slug}.json")
+        if not os.path.exists(path):
+            continue
+        data = _load_json(path)
+        merged = dict(data.get('details') or {})
+        merged.update({k: v for k, v in new_details.items() if v is not None})
+        if merged != data.get('details'):
+            data['details'] = merged
+            writer.write_json(path, data)
+            changed += 1
+    writer.flush()
+    logger.info(f"更新了 {changed} 个社区的details")
+    return changed
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Catalog-wide analytics over scraped Pulte communities')
+    parser.add_argument('--json-dir', default='data/pulte/json')
+    parser.add_argument('--group-by', default='state,market', help='Comma separated columns for market stats')
+    parser.add_argument('--write-details', action='store_true', help='Recompute details ranges and write them back')
+    parser.add_argument('--csv', help='Write market stats to this CSV file')
+    args = parser.parse_args()
+
+    communities, plans, homesites = load_catalog(args.json_dir)
+    stats = market_stats(communities, homesites, args.group_by.split(','))
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(stats.to_string())
+        print()
+        print(inventory_by_state(homesites).to_string())
+    if args.csv:
+        stats.to_csv(args.csv)
+        logger.info(f"统计结果已保存到: {args.csv}")
+    if args.write_details:
+        write_back_details(args.json_dir, community_details(plans, homesites))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from pulte_writer import atomic_write, dump_json
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = 'data/pulte/assets'
+DOWNLOAD_WORKERS = 8
+CHUNK_SIZE = 256 * 1024
+# 每下载多少个文件保存一次清单，中断后可以从清单继续
+MANIFEST_SAVE_EVERY = 50
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+
+def collect_asset_urls(json_dir='data/pulte/json'):
+    """从所有社区JSON中收集图片和户型图URL，按首次出现顺序去重"""
+    urls = {}
+
+    def add(url, kind):
+        if url and isinstance(url, str) and url.startswith('http') and url not in urls:
+            urls[url] = kind
+
+    for name in sorted(os.listdir(json_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"读取 {name} 时出错: {str(e)}")
+            continue
+        for url in data.get('images') or []:
+            add(url, 'community_image')
+        for plan in data.get('homeplans') or []:
+            add((plan.get('details') or {}).get('image_url'), 'plan_image')
+            for floorplan in plan.get('floorplan_images') or []:
+                add(floorplan.get('url'), 'floorplan')
+        for homesite in data.get('homesites') or []:
+            add(homesite.get('image_url'), 'plan_image')
+            for url in homesite.get('images') or []:
+                add(url, 'homesite_image')
+            for floorplan in homesite.get('floorplan_images') or []:
+                add(floorplan.get('url'), 'floorplan')
+    logger.info(f"收集到 {len(urls)} 个不重复的资源URL")
+    return urls
+
+
+def build_session(workers=DOWNLOAD_WORKERS):
+    """连接池大小与并发数一致的Session，带重试"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def _extension(url, content_type):
+    ext = mimetypes.guess_extension((content_type or '').split(';')[0].strip()) if content_type else None
+    if not ext:
+        ext = os.path.splitext(urlparse(url).path)[1]
+    if ext in ('.jpe', '.jpeg'):
+        ext = '.jpg'
+    return ext if ext and len(ext) <= 5 else ''
+
+
+class AssetDownloader:
+    """并发下载资源文件
+
+    - 按URL去重：清单中已有且文件存在的URL直接跳过
+    - 按内容去重：文件以sha256命名，不同URL内容相同时只保存一份
+    - 断点续传：未完成的下载保存为.part，下次用Range请求继续
+    清单 manifest.json 记录 URL -> 本地路径/哈希/大小。
+    """
+
+    def __init__(self, assets_dir=ASSETS_DIR, workers=DOWNLOAD_WORKERS, timeout=60):
+        self.assets_dir = assets_dir
+        self.parts_dir = os.path.join(assets_dir, '.parts')
+        self.manifest_path = os.path.join(assets_dir, 'manifest.json')
+        self.workers = workers
+        self.timeout = timeout
+        self.session = build_session(workers)
+        self.manifest = {"urls": {}, "hashes": {}}
+        self.stats = {"downloaded": 0, "skipped": 0, "deduplicated": 0, "failed": 0, "bytes": 0}
+        self._lock = threading.Lock()
+        os.makedirs(self.parts_dir, exist_ok=True)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            logger.info(f"载入资源清单: {len(self.manifest['urls'])} 个URL")
+
+    def save_manifest(self):
+        with self._lock:
+            payload = dump_json(self.manifest)
+        atomic_write(self.manifest_path, payload)
+
+    def _done(self, url):
+        entry = self.manifest["urls"].get(url)
+        return entry is not None and os.path.exists(os.path.join(self.assets_dir, entry["path"]))
+
+    def download(self, url, kind=None):
+        """下载单个URL，返回清单条目"""
+        with self._lock:
+            if self._done(url):
+                self.stats["skipped"] += 1
+                return self.manifest["urls"][url]
+
+        part_path = os.path.join(self.parts_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.part')
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # 服务器认为已经下载完整
+                pass
+            else:
+                response.raise_for_status()
+                mode = 'ab' if offset and response.status_code == 206 else 'wb'
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            content_type = response.headers.get('Content-Type')
+
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        size = os.path.getsize(part_path)
+
+        with self._lock:
+            existing = self.manifest["hashes"].get(sha)
+            if existing and os.path.exists(os.path.join(self.assets_dir, existing)):
+                os.remove(part_path)
+                rel_path = existing
+                self.stats["deduplicated"] += 1
+            else:
+                rel_path = os.path.join(sha[:2], sha + _extension(url, content_type)).replace(os.sep, '/')
+                dest = os.path.join(self.assets_dir, rel_path)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.replace(part_path, dest)
+                self.manifest["hashes"][sha] = rel_path
+                self.stats["downloaded"] += 1
+                self.stats["bytes"] += size
+            entry = {"path": rel_path, "sha256": sha, "size": size, "content_type": content_type, "kind": kind}
+            self.manifest["urls"][url] = entry
+        return entry
+
+    def run(self, urls):
+        """并发下载 {url: kind}，返回统计信息"""
+        todo = {url: kind for url, kind in urls.items() if not self._done(url)}
+        self.stats["skipped"] += len(urls) - len(todo)
+        logger.info(f"待下载 {len(todo)} 个资源 (已完成 {len(urls) - len(todo)} 个), 并发 {self.workers}")
+        finished = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {pool.submit(self.download, url, kind): url for url, kind in todo.items()}
+                for future in as_completed(futures):
+                    url = futures[future]
+                    try:
+                        future.result()
+                    except Exception as e:
+                        with self._lock:
+                            self.stats["failed"] += 1
+                        logger.error(f"下载失败 {url}: {str(e)}")
+                    finished += 1
+                    if finished % MANIFEST_SAVE_EVERY == 0:
+                        self.save_manifest()
+                        logger.info(f"下载进度 {finished}/{len(todo)}: {self.stats}")
+        finally:
+            self.save_manifest()
+        logger.info(f"资源下载完成: {self.stats}")
+        return self.stats
+
+
+def download_assets(json_dir='data/pulte/json', assets_dir=ASSETS_DIR, workers=DOWNLOAD_WORKERS):
+    """收集所有社区JSON中的资源URL并下载"""
+    return AssetDownloader(assets_dir, workers).run(collect_asset_urls(json_dir))
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Download images and floorplans referenced by scraped communities')
+    parser.add_argument('--json-dir', default='data/pulte/json')
+    parser.add_argument('--assets-dir', default=ASSETS_DIR)
+    parser.add_argument('--workers', type=int, default=DOWNLOAD_WORKERS)
+    args = parser.parse_args()
+    download_assets(args.json_dir, args.assets_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
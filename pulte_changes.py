@@ -0,0 +1,277 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+
+from pulte_scheduler import community_slug, content_hash
+from pulte_writer import atomic_write, dump_json
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_INDEX_FILE = 'data/pulte/snapshot_index.json'
+CHANGE_FEED_FILE = 'data/pulte/changes.jsonl'
+
+EVENT_COMMUNITY_ADDED = 'community_added'
+EVENT_COMMUNITY_REMOVED = 'community_removed'
+EVENT_HOMESITE_ADDED = 'homesite_added'
+EVENT_HOMESITE_REMOVED = 'homesite_removed'
+EVENT_PRICE_CHANGED = 'price_changed'
+EVENT_HOMESITE_STATUS_CHANGED = 'homesite_status_changed'
+EVENT_PLAN_ADDED = 'plan_added'
+EVENT_PLAN_REMOVED = 'plan_removed'
+EVENT_PLAN_PRICE_CHANGED = 'plan_price_changed'
+EVENT_PLAN_STATUS_CHANGED = 'plan_status_changed'
+
+
+def record_hash(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def homesite_key(homesite):
+    """homesite的稳定键：从URL提取的id；没有URL时id只是序号，改用名称"""
+    if homesite.get('url') and homesite.get('id'):
+        return str(homesite['id'])
+    return f"name:{homesite.get('name')}"
+
+
+def summarize(data):
+    """一个社区的快照摘要：整体哈希，以及每个homesite/户型的哈希和关键字段"""
+    return {
+        "hash": content_hash(data),
+        "url": data.get('url'),
+        "name": data.get('name'),
+        "homesites": {
+            homesite_key(h): {
+                "hash": record_hash(h),
+                "name": h.get('name'),
+                "plan": h.get('plan'),
+                "price": h.get('price'),
+                "status": h.get('status'),
+            } for h in data.get('homesites') or []
+        },
+        "plans": {
+            p.get('name'): {
+                "hash": record_hash(p),
+                "price": (p.get('details') or {}).get('price'),
+                "status": (p.get('details') or {}).get('status'),
+            } for p in data.get('homeplans') or []
+        },
+    }
+
+
+def diff_summaries(slug, old, new):
+    """比较同一社区的两份摘要，返回事件列表；只有哈希不同的记录才逐字段比较"""
+    if old is None:
+        return [{"type": EVENT_COMMUNITY_ADDED, "community": slug, "url": new["url"], "name": new["name"],
+                 "homesites": len(new["homesites"]), "plans": len(new["plans"])}]
+    if old["hash"] == new["hash"]:
+        return []
+
+    events = []
+    base = {"community": slug, "url": new["url"]}
+    old_sites, new_sites = old["homesites"], new["homesites"]
+    for key in sorted(new_sites.keys() - old_sites.keys()):
+        site = new_sites[key]
+        events.append(dict(base, type=EVENT_HOMESITE_ADDED, homesite=key, name=site["name"],
+                           plan=site["plan"], price=site["price"], status=site["status"]))
+    for key in sorted(old_sites.keys() - new_sites.keys()):
+        site = old_sites[key]
+        events.append(dict(base, type=EVENT_HOMESITE_REMOVED, homesite=key, name=site["name"],
+                           plan=site["plan"], price=site["price"], status=site["status"]))
+    for key in sorted(new_sites.keys() & old_sites.keys()):
+        before, after = old_sites[key], new_sites[key]
+        if before["hash"] == after["hash"]:
+            continue
+        if before["price"] != after["price"]:
+            events.append(dict(base, type=EVENT_PRICE_CHANGED, homesite=key, name=after["name"],
+                               old=before["price"], new=after["price"]))
+        if before["status"] != after["status"]:
+            events.append(dict(base, type=EVENT_HOMESITE_STATUS_CHANGED, homesite=key, name=after["name"],
+                               old=before["status"], new=after["status"]))
+
+    old_plans, new_plans = old["plans"], new["plans"]
+    for name in sorted(new_plans.keys() - old_plans.keys()):
+        events.append(dict(base, type=EVENT_PLAN_ADDED, plan=name, price=new_plans[name]["price"],
+                           status=new_plans[name]["status"]))
+    for name in sorted(old_plans.keys() - new_plans.keys()):
+        events.append(dict(base, type=EVENT_PLAN_REMOVED, plan=name))
+    for name in sorted(new_plans.keys() & old_plans.keys()):
+        before, after = old_plans[name], new_plans[name]
+        if before["hash"] == after["hash"]:
+            continue
+        if before["price"] != after["price"]:
+            events.append(dict(base, type=EVENT_PLAN_PRICE_CHANGED, plan=name,
+                               old=before["price"], new=after["price"]))
+        if before["status"] != after["status"]:
+            events.append(dict(base, type=EVENT_PLAN_STATUS_CHANGED, plan=name,
+                               old=before["status"], new=after["status"]))
+    return events
+
+
+class ChangeFeed:
+    """抓取过程中增量生成变化事件
+
+    快照索引保存每个社区的摘要（slug -> 哈希、homesite和户型的哈希与关键字段），
+    每抓完一个社区就与索引比较，事件立即追加到JSONL文件，不需要在抓取结束后重新载入全部数据。
+    索引不存在时从现有JSON目录建立，作为上一轮的快照。
+    原本有户型/homesite的社区突然变为全空时，多半是页面没有加载完整：第一次只标记不产生事件，
+    连续第二次仍为空才按下架处理，避免站点变慢时产生大量removed/added事件。
+
+    索引的每次更新先追加到日志文件（index_path + '.log'），再写出对应的事件；载入时把日志
+    重放到索引上，save()写出完整索引后清空日志。进程被杀掉时已写出的事件对应的索引更新
+    都在日志里，下次运行不会重复产生同样的事件。
+    """
+
+    def __init__(self, index_path=SNAPSHOT_INDEX_FILE, feed_path=CHANGE_FEED_FILE, json_dir=None):
+        self.index_path = index_path
+        self.feed_path = feed_path
+        self.log_path = index_path + '.log'
+        self.index = {}
+        self.events = 0
+        self._lock = threading.Lock()
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.index = json.load(f)
+                logger.info(f"载入快照索引: {len(self.index)} 个社区")
+            except Exception as e:
+                logger.error(f"读取快照索引失败 {index_path}: {str(e)}")
+            self._replay()
+        elif json_dir and os.path.isdir(json_dir):
+            self.rebuild(json_dir)
+
+    def _replay(self):
+        """把上次未保存的索引更新重放到索引上"""
+        if not os.path.exists(self.log_path):
+            return
+        applied = 0
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"忽略索引日志中不完整的一行: {self.log_path}")
+                    continue
+                if record["summary"] is None:
+                    self.index.pop(record["community"], None)
+                else:
+                    self.index[record["community"]] = record["summary"]
+                applied += 1
+        logger.info(f"从索引日志恢复 {applied} 条未保存的更新")
+
+    def _log(self, updates):
+        """追加索引更新 [(slug, 摘要或None)]，在写出对应事件之前调用"""
+        lines = ''.join(json.dumps({"community": slug, "summary": summary}, ensure_ascii=False) + '\n'
+                        for slug, summary in updates)
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def rebuild(self, json_dir):
+        """从JSON目录重建索引，不产生事件"""
+        index = {}
+        for name in sorted(os.listdir(json_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.error(f"读取 {name} 时出错: {str(e)}")
+                continue
+            if data.get('url'):
+                index[community_slug(data['url'])] = summarize(data)
+        with self._lock:
+            self.index = index
+        logger.info(f"从 {json_dir} 建立快照索引: {len(index)} 个社区")
+        # 重建的索引取代之前的日志
+        self.save()
+
+    def _emit(self, events, now=None):
+        if not events:
+            return
+        stamp = (now or datetime.now()).isoformat()
+        lines = ''.join(json.dumps(dict(event, time=stamp), ensure_ascii=False) + '\n' for event in events)
+        with open(self.feed_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+        self.events += len(events)
+        for event in events:
+            logger.info(f"变化: {event['type']} {event['community']} "
+                        f"{event.get('homesite') or event.get('plan') or ''}".rstrip())
+
+    def observe(self, url, data, now=None):
+        """记录一个社区的最新抓取结果，返回产生的事件"""
+        slug = community_slug(url)
+        summary = summarize(data)
+        with self._lock:
+            old = self.index.get(slug)
+            if (not summary["homesites"] and not summary["plans"] and old is not None
+                    and (old["homesites"] or old["plans"]) and not old.get("empty_pending")):
+                old["empty_pending"] = True
+                self._log([(slug, old)])
+                logger.warning(f"社区 {slug} 本次没有任何户型和homesite，疑似页面不完整，等待下次确认")
+                return []
+            events = diff_summaries(slug, old, summary)
+            self.index[slug] = summary
+            self._log([(slug, summary)])
+            self._emit(events, now)
+        return events
+
+    def removed(self, urls, now=None):
+        """本轮链接列表中已不存在的社区记为下架并移出索引"""
+        current = {community_slug(url) for url in urls}
+        with self._lock:
+            events = [{"type": EVENT_COMMUNITY_REMOVED, "community": slug, "url": summary["url"],
+                       "name": summary["name"]}
+                      for slug, summary in self.index.items() if slug not in current]
+            for event in events:
+                del self.index[event["community"]]
+            if events:
+                self._log([(event["community"], None) for event in events])
+            self._emit(events, now)
+        return events
+
+    def save(self):
+        with self._lock:
+            atomic_write(self.index_path, dump_json(self.index))
+            # 完整索引已落盘，日志中的更新都已包含在内
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+        logger.info(f"快照索引已保存到: {self.index_path} (本轮 {self.events} 个变化事件)")
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Maintain the snapshot index behind the crawl change feed')
+    parser.add_argument('--json-dir', default='data/pulte/json')
+    parser.add_argument('--index', default=SNAPSHOT_INDEX_FILE)
+    parser.add_argument('--feed', default=CHANGE_FEED_FILE)
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the index from the JSON directory without emitting events')
+    parser.add_argument('--scan', action='store_true', help='Diff the JSON directory against the index and emit events')
+    args = parser.parse_args()
+
+    feed = ChangeFeed(args.index, args.feed)
+    if args.rebuild:
+        feed.rebuild(args.json_dir)
+    elif args.scan:
+        for name in sorted(os.listdir(args.json_dir)):
+            if not name.endswith('.json'):
+                continue
+            with open(os.path.join(args.json_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('url'):
+                feed.observe(data['url'], data)
+    feed.save()
+
+
+if __name__ == "__main__":
+    main()
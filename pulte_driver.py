@@ -0,0 +1,307 @@
+import logging
+import os
+import signal
+import threading
+import time
+import atexit
+
+try:
+    import psutil
+except ImportError:  # psutil是可选依赖，没有时退化为只清理本进程记录的PID
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# 单次导航（driver.get + 读取page_source）的时间预算，秒
+PAGE_LOAD_TIMEOUT = 60
+# 单个社区（社区页 + 所有homesite页）的时间预算，秒
+COMMUNITY_TIMEOUT = 900
+# 页面加载后的固定等待时间，秒
+PAGE_SETTLE_SECONDS = 5
+# 额外的Chrome启动参数，例如回放测试时屏蔽外部域名
+EXTRA_CHROME_ARGS = [arg for arg in os.environ.get('PULTE_CHROME_ARGS', '').split('\n') if arg]
+
+# 本进程启动的chromedriver/chrome进程PID，用于兜底清理
+_tracked_pids = set()
+_tracked_lock = threading.Lock()
+
+
+class NavigationTimeout(Exception):
+    """单次页面导航超时"""
+
+
+class CommunityTimeout(Exception):
+    """单个社区处理超时"""
+
+
+class Deadline:
+    """社区级别的时间预算"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.started = time.monotonic()
+
+    def remaining(self):
+        if self.seconds is None:
+            return None
+        return self.seconds - (time.monotonic() - self.started)
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def check(self, what=""):
+        """超出预算时抛出CommunityTimeout"""
+        if self.expired():
+            raise CommunityTimeout(f"超过社区时间预算 {self.seconds}s {what}".strip())
+
+
+def setup_driver(page_load_timeout=None, page_load_strategy=None):
+    """设置Chrome驱动"""
+    # selenium延迟到真正需要浏览器时才导入，离线命令（reparse/filter/stats等）不加载它
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument('--headless')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--window-size=1920,1080')
+    chrome_options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    for arg in EXTRA_CHROME_ARGS:
+        chrome_options.add_argument(arg)
+    if page_load_strategy:
+        chrome_options.page_load_strategy = page_load_strategy
+    page_load_timeout = page_load_timeout or PAGE_LOAD_TIMEOUT
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.set_page_load_timeout(page_load_timeout)
+    driver.set_script_timeout(page_load_timeout)
+    _track_driver(driver)
+    return driver
+
+
+def _driver_pids(driver):
+    """获取driver对应的chromedriver及其子进程(chrome)的PID"""
+    pids = []
+    try:
+        service_pid = driver.service.process.pid
+    except Exception:
+        return pids
+    pids.append(service_pid)
+    if psutil is not None:
+        try:
+            pids.extend(p.pid for p in psutil.Process(service_pid).children(recursive=True))
+        except psutil.Error:
+            pass
+    return pids
+
+
+def _track_driver(driver):
+    with _tracked_lock:
+        _tracked_pids.update(_driver_pids(driver))
+
+
+def _kill_pids(pids):
+    """强制结束进程，忽略已经退出的进程"""
+    for pid in pids:
+        try:
+            os.kill(pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+            logger.warning(f"强制结束残留进程: {pid}")
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+    with _tracked_lock:
+        _tracked_pids.difference_update(pids)
+
+
+def quit_driver(driver):
+    """退出driver，quit失败或进程仍存活时强制结束"""
+    if driver is None:
+        return
+    pids = _driver_pids(driver)
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.error(f"关闭driver时出错: {str(e)}")
+    alive = [pid for pid in pids if _pid_alive(pid)]
+    _kill_pids(alive)
+    with _tracked_lock:
+        _tracked_pids.difference_update(pids)
+
+
+def _pid_alive(pid):
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def reap_orphaned_drivers():
+    """清理孤儿chromedriver/chrome进程
+
+    清理父进程已退出（被init接管）的headless chromedriver/chrome进程。本进程记录的PID
+    以及本进程的直接子进程一律跳过：容器里爬虫本身就是PID 1时，正在使用的chromedriver
+    的ppid也是1，不能据此判断为孤儿。本进程记录的PID只在进程退出时统一清理，
+    这里仅从记录中移除已经退出的PID。
+    """
+    reaped = 0
+    if psutil is not None:
+        me = os.getpid()
+        try:
+            username = psutil.Process(me).username()
+        except psutil.Error:
+            username = None
+        with _tracked_lock:
+            tracked = set(_tracked_pids)
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'cmdline', 'username']):
+            info = proc.info
+            if info['pid'] == me or info['pid'] in tracked or info.get('ppid') == me:
+                continue
+            name = (info.get('name') or '').lower()
+            if 'chromedriver' not in name and 'chrome' not in name:
+                continue
+            if username and info.get('username') != username:
+                continue
+            cmdline = ' '.join(info.get('cmdline') or [])
+            orphaned = info.get('ppid') in (0, 1)
+            if orphaned and ('chromedriver' in name or '--headless' in cmdline):
+                try:
+                    proc.kill()
+                    reaped += 1
+                    logger.warning(f"清理孤儿进程: {info['pid']} {name}")
+                except psutil.Error:
+                    pass
+    with _tracked_lock:
+        dead = [pid for pid in _tracked_pids if not _pid_alive(pid)]
+        _tracked_pids.difference_update(dead)
+    if reaped:
+        logger.info(f"共清理 {reaped} 个孤儿浏览器进程")
+    return reaped
+
+
+@atexit.register
+def _reap_tracked_on_exit():
+    """进程退出时清理仍存活的浏览器进程"""
+    with _tracked_lock:
+        pids = list(_tracked_pids)
+    _kill_pids([pid for pid in pids if _pid_alive(pid)])
+
+
+class ManagedDriver:
+    """受监管的Chrome驱动
+
+    - 保证退出：配合with语句使用，任何异常路径都会关闭浏览器
+    - 导航超时：driver.get和page_source都受看门狗约束，超时后强制结束浏览器
+    - 自动替换：超时或driver崩溃后，下一次导航会使用新的driver
+    """
+
+    def __init__(self, page_load_timeout=None, settle_seconds=None):
+        self.page_load_timeout = page_load_timeout or PAGE_LOAD_TIMEOUT
+        self.settle_seconds = PAGE_SETTLE_SECONDS if settle_seconds is None else settle_seconds
+        self.driver = None
+        self.replacements = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.quit()
+        return False
+
+    def _ensure_driver(self):
+        if self.driver is None:
+            self.driver = setup_driver(self.page_load_timeout)
+        return self.driver
+
+    def open(self, url, deadline=None):
+        """打开页面并返回page_source
+
+        看门狗时间取单次导航预算和社区剩余预算中较小者，超时抛出NavigationTimeout。
+        """
+        if deadline is not None:
+            deadline.check(url)
+        budget = self.page_load_timeout + self.settle_seconds
+        if deadline is not None and deadline.remaining() is not None:
+            budget = min(budget, max(deadline.remaining(), 1))
+
+        driver = self._ensure_driver()
+        from selenium.common.exceptions import TimeoutException
+        fired = threading.Event()
+
+        def _on_timeout():
+            fired.set()
+            logger.error(f"页面超过 {budget:.0f}s 未完成，强制结束浏览器: {url}")
+            _kill_pids(_driver_pids(driver))
+
+        watchdog = threading.Timer(budget, _on_timeout)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            driver.get(url)
+            time.sleep(min(self.settle_seconds, max(budget - 1, 0)))
+            html = driver.page_source
+        except TimeoutException as e:
+            self.replace()
+            raise NavigationTimeout(f"页面加载超时: {url}") from e
+        except Exception as e:
+            # 看门狗结束浏览器后，阻塞中的调用会以连接错误的形式返回
+            self.replace()
+            if fired.is_set():
+                raise NavigationTimeout(f"页面加载超时: {url}") from e
+            raise
+        finally:
+            watchdog.cancel()
+        if fired.is_set():
+            self.replace()
+            raise NavigationTimeout(f"页面加载超时: {url}")
+        return html
+
+    def replace(self):
+        """丢弃当前driver，下一次导航时重新创建"""
+        if self.driver is not None:
+            logger.warning("替换Chrome驱动")
+            quit_driver(self.driver)
+            self.driver = None
+            self.replacements += 1
+
+    def quit(self):
+        quit_driver(self.driver)
+        self.driver = None
+
+
+class ArchiveDriver:
+    """从已归档的HTML读取页面，接口与ManagedDriver相同，用于不启动浏览器的重新解析
+
+    URL按最后一段映射到 html_dir/pulte_{slug}.html，与fetch_page保存HTML时的命名一致。
+    """
+
+    def __init__(self, html_dir='data/pulte/html'):
+        self.html_dir = html_dir
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def path_for(self, url):
+        return os.path.join(self.html_dir, f"pulte_{url.rstrip('/').split('/')[-1]}.html")
+
+    def open(self, url, deadline=None):
+        path = self.path_for(url)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"没有归档的HTML: {path}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def replace(self):
+        pass
+
+    def quit(self):
+        pass
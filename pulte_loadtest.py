@@ -0,0 +1,225 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # 没有psutil时只报告getrusage的汇总数据
+    psutil = None
+
+import pulte_driver
+from pulte_replay import ReplayServer, OFFLINE_CHROME_ARGS
+from pulte_writer import atomic_write, dump_json
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values, pct):
+    """线性插值的百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class ResourceSampler:
+    """定时采样本进程及子进程(chromedriver/chrome)的RSS和CPU"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu_samples = []
+        self.max_processes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pulte-sampler', daemon=True)
+
+    def _run(self):
+        me = psutil.Process()
+        me.cpu_percent(None)
+        while not self._stop.wait(self.interval):
+            try:
+                procs = [me] + me.children(recursive=True)
+            except psutil.Error:
+                continue
+            rss = 0
+            cpu = 0.0
+            for proc in procs:
+                try:
+                    rss += proc.memory_info().rss
+                    cpu += proc.cpu_percent(None)
+                except psutil.Error:
+                    pass
+            self.peak_rss = max(self.peak_rss, rss)
+            self.cpu_samples.append(cpu)
+            self.max_processes = max(self.max_processes, len(procs))
+
+    def __enter__(self):
+        if psutil is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return False
+
+    def report(self):
+        if psutil is None:
+            import resource
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            return {"children_cpu_seconds": usage.ru_utime + usage.ru_stime}
+        return {
+            "peak_rss_mb": round(self.peak_rss / 1024 / 1024, 1),
+            "avg_cpu_percent": round(sum(self.cpu_samples) / len(self.cpu_samples), 1) if self.cpu_samples else None,
+            "max_processes": self.max_processes,
+        }
+
+
+def summarize(name, wall, latencies, server_requests, pages):
+    """汇总一个阶段的吞吐和延迟"""
+    statuses = {}
+    for _, status, _ in server_requests:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    server_latencies = [elapsed for _, _, elapsed in server_requests]
+    return {
+        "phase": name,
+        "wall_seconds": round(wall, 2),
+        "pages": pages,
+        "pages_per_sec": round(pages / wall, 3) if wall > 0 else None,
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "server_requests": len(server_requests),
+        "server_p95_latency": percentile(server_latencies, 95),
+        "server_status": statuses,
+    }
+
+
+def run_load_test(archive_dir='data/pulte/html', json_dir='data/pulte/json', links_file='pulte_links.json',
+                  latency=0.0, jitter=0.0, error_rate=0.0, block_rate=0.0, settle_seconds=0.5,
+                  adaptive=True, max_concurrency=4, skip_discovery=False, workdir=None):
+    """启动回放服务器，依次跑链接发现和批量抓取，返回报告"""
+    archive_dir = os.path.abspath(archive_dir)
+    json_dir = os.path.abspath(json_dir)
+    links_file = os.path.abspath(links_file)
+    workdir = workdir or tempfile.mkdtemp(prefix='pulte-loadtest-')
+    os.makedirs(workdir, exist_ok=True)
+
+    server = ReplayServer(archive_dir=archive_dir, json_dir=json_dir, links_file=links_file,
+                          latency=latency, jitter=jitter, error_rate=error_rate, block_rate=block_rate,
+                          seed=0).start()
+
+    # 让爬虫模块指向回放服务器
+    import get_pulte_page
+    import get_pulte_api_links
+    get_pulte_page.BASE_URL = server.base_url
+    get_pulte_api_links.BASE_URL = server.base_url
+    pulte_driver.EXTRA_CHROME_ARGS = list(pulte_driver.EXTRA_CHROME_ARGS) + OFFLINE_CHROME_ARGS
+    pulte_driver.PAGE_SETTLE_SECONDS = settle_seconds
+
+    report = {"base_url": server.base_url, "workdir": workdir, "phases": []}
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with ResourceSampler() as sampler:
+            if skip_discovery:
+                urls = [server.community_url(path) for path in server.communities]
+            else:
+                mark = len(server.requests)
+                started = time.monotonic()
+                initial_links = get_pulte_api_links.get_initial_links()
+                community_links = get_pulte_api_links.get_community_links(initial_links)
+                urls = [link for link in community_links if get_pulte_api_links.is_valid_link(link)]
+                wall = time.monotonic() - started
+                requests = server.requests[mark:]
+                report["phases"].append(summarize(
+                    "discover", wall, [elapsed for _, _, elapsed in requests], requests, len(requests)
+                ))
+                logger.info(f"发现阶段找到 {len(urls)} 个社区链接")
+
+            mark = len(server.requests)
+            latencies = []
+            lock = threading.Lock()
+            output_dir = os.path.join(workdir, 'data', 'pulte')
+
+            def fetch(url):
+                started = time.monotonic()
+                outcome = get_pulte_page.fetch_outcome(url, output_dir, force=True)
+                with lock:
+                    latencies.append(time.monotonic() - started)
+                return outcome
+
+            started = time.monotonic()
+            if adaptive:
+                from pulte_throttle import AdaptiveController, run_adaptive_batch
+                controller = AdaptiveController(max_concurrency=max_concurrency, min_delay=0)
+                outcomes = run_adaptive_batch(urls, fetch, controller)
+            else:
+                outcomes = {}
+                for url in urls:
+                    outcome = fetch(url)
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            wall = time.monotonic() - started
+            requests = server.requests[mark:]
+            pages = sum(1 for _, status, _ in requests if status == 200)
+            phase = summarize("crawl", wall, latencies, requests, pages)
+            phase["communities"] = len(urls)
+            phase["outcomes"] = outcomes
+            report["phases"].append(phase)
+        report["resources"] = sampler.report()
+    finally:
+        os.chdir(cwd)
+        server.stop()
+    return report
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Run discovery and batch crawl against the offline replay server')
+    parser.add_argument('--archive-dir', default='data/pulte/html')
+    parser.add_argument('--json-dir', default='data/pulte/json')
+    parser.add_argument('--links', default='pulte_links.json')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--block-rate', type=float, default=0.0)
+    parser.add_argument('--settle', type=float, default=0.5, help='Seconds to wait after each page load')
+    parser.add_argument('--sequential', action='store_true', help='Crawl without the adaptive controller')
+    parser.add_argument('--max-concurrency', type=int, default=4)
+    parser.add_argument('--skip-discovery', action='store_true')
+    parser.add_argument('--report', help='Write the JSON report to this file')
+    args = parser.parse_args()
+
+    report = run_load_test(
+        args.archive_dir, args.json_dir, args.links,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, block_rate=args.block_rate,
+        settle_seconds=args.settle, adaptive=not args.sequential, max_concurrency=args.max_concurrency,
+        skip_discovery=args.skip_discovery
+    )
+    for phase in report["phases"]:
+        logger.info(f"[{phase['phase']}] {phase['pages']} 页 / {phase['wall_seconds']}s = "
+                    f"{phase['pages_per_sec']} 页/秒, p95 {phase['p95_latency']}")
+    logger.info(f"资源占用: {report['resources']}")
+    if args.report:
+        atomic_write(args.report, dump_json(report))
+        logger.info(f"报告已保存到: {args.report}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
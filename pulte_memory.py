@@ -0,0 +1,141 @@
+import logging
+import re
+import sys
+import threading
+
+from bs4 import SoupStrainer
+
+try:
+    import psutil
+except ImportError:  # psutil是可选依赖
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# 正在进行的PeakRSS测量；高水位是进程级的，有其他测量在进行时不能重置
+_active = set()
+_active_lock = threading.Lock()
+
+# 解析时用不到的子树：脚本（内嵌数据已由ScriptDataIndex单独提取）、样式、内联SVG图标等，
+# 在大页面上约占HTML的四分之三
+PRUNE_RE = re.compile(
+    r'<(script|style|svg|noscript|template|iframe)\b.*?</\1\s*>|<!--.*?-->',
+    re.S | re.I
+)
+
+
+def prune_html(html):
+    """去掉解析用不到的子树，返回新的HTML字符串"""
+    return PRUNE_RE.sub('', html)
+
+
+def class_tokens(attrs):
+    """起始标签class属性中的各个类名；不同bs4版本传入的attrs可能是dict或(名称, 值)列表"""
+    value = dict(attrs or {}).get('class') or ''
+    return value.split() if isinstance(value, str) else list(value)
+
+
+class SubtreeStrainer(SoupStrainer):
+    """只为keep(name, attrs)为真的元素及其子树建立节点，其余标签和文本在解析时直接丢弃
+
+    与剪枝不同，页面主体中用不到的大段导航、页脚、地图等也不会进入解析树。
+    bs4 4.13之前以 (name, attrs) 调用名称函数；4.13起改为调用allow_tag_creation。
+    """
+
+    def __init__(self, keep):
+        super().__init__(keep)
+        self.keep = keep
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return bool(self.keep(name, attrs))
+
+    def allow_string_creation(self, string):
+        return False
+
+
+def _read_status(field):
+    """读取/proc/self/status中的某个字段，单位KB"""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def current_rss_mb():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    rss = _read_status('VmRSS')
+    return rss / 1024 if rss is not None else None
+
+
+class PeakRSS:
+    """测量一段代码执行期间的进程峰值RSS（MB）
+
+    Linux上通过清零/proc/self/clear_refs重置高水位后读取VmHWM，得到该段代码的真实峰值；
+    其他平台退化为结束时的RSS或进程生命周期内的ru_maxrss。
+    只有没有其他测量在进行时才重置高水位；与其他测量重叠的一段（并发抓取）只能得到
+    整个进程的峰值，日志中会注明。
+    """
+
+    def __init__(self, label=''):
+        self.label = label
+        self.peak_mb = None
+        self.start_mb = None
+        self._hwm = False
+        self.concurrent = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    def start(self):
+        self.start_mb = current_rss_mb()
+        with _active_lock:
+            if _active:
+                # 重置会破坏其他线程的测量窗口，双方都只报告进程峰值
+                self.concurrent = True
+                for other in _active:
+                    other.concurrent = True
+                self._hwm = _read_status('VmHWM') is not None
+            else:
+                try:
+                    with open('/proc/self/clear_refs', 'w') as f:
+                        f.write('5')  # 5: 重置峰值RSS
+                    self._hwm = _read_status('VmHWM') is not None
+                except OSError:
+                    self._hwm = False
+            _active.add(self)
+        return self
+
+    def close(self):
+        """结束测量但不记录结果，用于异常路径；已经stop的测量调用无影响"""
+        with _active_lock:
+            _active.discard(self)
+
+    def stop(self):
+        """结束测量并记录日志，返回峰值MB"""
+        with _active_lock:
+            _active.discard(self)
+        if self._hwm:
+            self.peak_mb = _read_status('VmHWM') / 1024
+        elif psutil is not None:
+            self.peak_mb = current_rss_mb()
+        else:
+            try:
+                import resource
+            except ImportError:
+                return None
+            scale = 1 if sys.platform == 'darwin' else 1024  # macOS单位为字节，其余为KB
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1024 / 1024
+        if self.peak_mb is not None:
+            scope = " (与其他页面并发，为进程峰值)" if self.concurrent else ""
+            logger.info(f"内存峰值 {self.label}: {self.peak_mb:.1f} MB{scope}"
+                        + (f" (开始时 {self.start_mb:.1f} MB)" if self.start_mb is not None else ""))
+        return self.peak_mb
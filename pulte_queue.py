@@ -0,0 +1,409 @@
+import abc
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from pulte_throttle import OUTCOME_OK, OUTCOME_ERROR, OUTCOME_BLOCKED
+from pulte_writer import SyncWriter
+
+logger = logging.getLogger(__name__)
+
+# 租约时长，秒；worker需要在到期前发送心跳续约
+LEASE_SECONDS = 300
+HEARTBEAT_INTERVAL = 60
+MAX_ATTEMPTS = 3
+
+STATE_PENDING = 'pending'
+STATE_LEASED = 'leased'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+
+class Lease:
+    """一次URL租约，token用于校验心跳和结果提交的归属"""
+
+    def __init__(self, url, token, worker_id, expires_at, attempts):
+        self.url = url
+        self.token = token
+        self.worker_id = worker_id
+        self.expires_at = expires_at
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Lease({self.url!r}, worker={self.worker_id!r}, attempts={self.attempts})"
+
+
+class WorkQueue(abc.ABC):
+    """共享工作队列接口，网络消息队列等后端实现这些方法即可接入"""
+
+    @abc.abstractmethod
+    def enqueue(self, urls):
+        """加入URL，已存在的URL保持原状态，返回新增数量"""
+
+    @abc.abstractmethod
+    def lease(self, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        """租用一个待处理或租约已过期的URL，没有任务时返回None
+
+        租约过期说明持有它的worker已崩溃，已达到max_attempts的URL改为failed，不再重新租出。
+        """
+
+    @abc.abstractmethod
+    def heartbeat(self, lease, lease_seconds=LEASE_SECONDS):
+        """续约，租约已被他人接管时返回False"""
+
+    @abc.abstractmethod
+    def complete(self, lease, result):
+        """提交结果，只有持有当前租约的worker能提交成功，保证每个URL只提交一次"""
+
+    @abc.abstractmethod
+    def fail(self, lease, error, max_attempts=MAX_ATTEMPTS):
+        """释放租约，未超过重试次数时重新排队"""
+
+    @abc.abstractmethod
+    def counts(self):
+        """各状态的任务数量"""
+
+    @abc.abstractmethod
+    def results(self):
+        """遍历已提交的结果 (url, data)"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """基于SQLite文件锁的队列，适合单机多进程或共享文件系统上的少量主机"""
+
+    def __init__(self, path, wal=True):
+        self.path = path
+        self.wal = wal
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS tasks (
+                    url TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    lease_token TEXT,
+                    worker_id TEXT,
+                    lease_expires REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    updated_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_state ON tasks(state, lease_expires);
+                CREATE TABLE IF NOT EXISTS results (
+                    url TEXT PRIMARY KEY,
+                    lease_token TEXT NOT NULL,
+                    worker_id TEXT,
+                    committed_at REAL,
+                    data TEXT NOT NULL
+                );
+            ''')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: 手动控制事务，BEGIN IMMEDIATE获取写锁保证租约原子性
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            if self.wal:
+                conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    def enqueue(self, urls):
+        conn = self._transaction()
+        try:
+            now = time.time()
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT OR IGNORE INTO tasks (url, state, updated_at) VALUES (?, ?, ?)',
+                [(url, STATE_PENDING, now) for url in urls]
+            )
+            added = conn.total_changes - before
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        logger.info(f"加入队列 {added} 个URL (共提交 {len(urls)} 个)")
+        return added
+
+    def lease(self, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        conn = self._transaction()
+        try:
+            now = time.time()
+            # 反复导致worker崩溃（如OOM）的URL不能在所有worker之间无限循环
+            reaped = conn.execute(
+                'UPDATE tasks SET state = ?, lease_token = NULL, lease_expires = NULL, last_error = ?, '
+                'updated_at = ? WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+                (STATE_FAILED, '租约过期（worker可能已崩溃），超过最大尝试次数', now,
+                 STATE_LEASED, now, max_attempts)
+            ).rowcount
+            if reaped:
+                logger.warning(f"{reaped} 个URL的租约过期且超过最大尝试次数，标记为失败")
+            row = conn.execute(
+                'SELECT url, attempts FROM tasks '
+                'WHERE state = ? OR (state = ? AND lease_expires < ?) '
+                'ORDER BY attempts, rowid LIMIT 1',
+                (STATE_PENDING, STATE_LEASED, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            url, attempts = row
+            token = uuid.uuid4().hex
+            expires = now + lease_seconds
+            conn.execute(
+                'UPDATE tasks SET state = ?, lease_token = ?, worker_id = ?, lease_expires = ?, '
+                'attempts = attempts + 1, updated_at = ? WHERE url = ?',
+                (STATE_LEASED, token, worker_id, expires, now, url)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return Lease(url, token, worker_id, expires, attempts + 1)
+
+    def heartbeat(self, lease, lease_seconds=LEASE_SECONDS):
+        conn = self._connect()
+        now = time.time()
+        cursor = conn.execute(
+            'UPDATE tasks SET lease_expires = ?, updated_at = ? '
+            'WHERE url = ? AND lease_token = ? AND state = ?',
+            (now + lease_seconds, now, lease.url, lease.token, STATE_LEASED)
+        )
+        if cursor.rowcount == 1:
+            lease.expires_at = now + lease_seconds
+            return True
+        return False
+
+    def complete(self, lease, result):
+        payload = json.dumps(result, ensure_ascii=False)
+        conn = self._transaction()
+        try:
+            now = time.time()
+            cursor = conn.execute(
+                'UPDATE tasks SET state = ?, lease_expires = NULL, updated_at = ? '
+                'WHERE url = ? AND lease_token = ? AND state = ?',
+                (STATE_DONE, now, lease.url, lease.token, STATE_LEASED)
+            )
+            if cursor.rowcount != 1:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO results (url, lease_token, worker_id, committed_at, data) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (lease.url, lease.token, lease.worker_id, now, payload)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return True
+
+    def fail(self, lease, error, max_attempts=MAX_ATTEMPTS):
+        conn = self._connect()
+        state = STATE_FAILED if lease.attempts >= max_attempts else STATE_PENDING
+        cursor = conn.execute(
+            'UPDATE tasks SET state = ?, lease_token = NULL, lease_expires = NULL, last_error = ?, updated_at = ? '
+            'WHERE url = ? AND lease_token = ? AND state = ?',
+            (state, str(error), time.time(), lease.url, lease.token, STATE_LEASED)
+        )
+        return cursor.rowcount == 1
+
+    def counts(self):
+        rows = self._connect().execute('SELECT state, COUNT(*) FROM tasks GROUP BY state').fetchall()
+        return dict(rows)
+
+    def results(self):
+        for url, data in self._connect().execute('SELECT url, data FROM results ORDER BY url'):
+            yield url, json.loads(data)
+
+
+# 队列后端注册表：scheme -> 构造函数(路径部分)
+_BACKENDS = {
+    'sqlite': SQLiteWorkQueue,
+}
+
+
+def register_backend(scheme, factory):
+    """注册新的队列后端，例如网络消息队列"""
+    _BACKENDS[scheme] = factory
+
+
+def open_queue(uri):
+    """按URI打开队列，例如 sqlite:///data/pulte/queue.db；不带scheme时视为SQLite文件路径"""
+    scheme, sep, rest = uri.partition('://')
+    if not sep:
+        return SQLiteWorkQueue(uri)
+    if scheme not in _BACKENDS:
+        raise ValueError(f"未知的队列后端: {scheme}")
+    if scheme == 'sqlite' and rest.startswith('/'):
+        rest = rest[1:]  # sqlite:///relative.db 与 sqlite:////abs/path.db
+    return _BACKENDS[scheme](rest)
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def run_worker(work_queue, process, worker_id=None, lease_seconds=LEASE_SECONDS,
+               heartbeat_interval=HEARTBEAT_INTERVAL, max_tasks=None, poll_interval=None,
+               controller=None, classify=None, after_task=None, max_attempts=MAX_ATTEMPTS):
+    """worker主循环：租用URL -> 处理（期间后台心跳续约）-> 提交结果
+
+    process(url)返回要提交的结果，返回None或抛出异常视为失败。
+    poll_interval为None时队列为空即退出，否则按间隔继续轮询。
+    controller为AdaptiveController时每次处理前acquire、处理后release，请求之间保持最小间隔，
+    失败时退避；classify(exception)把异常映射为OUTCOME_*。命中拦截页面时不把URL放回队列
+    （否则会立即被再次租出），而是保留租约、由熔断器暂停后重试同一URL，最多max_attempts次。
+    after_task在每次处理后调用，例如清理残留的浏览器进程。
+    """
+    worker_id = worker_id or default_worker_id()
+    done = 0
+    while max_tasks is None or done < max_tasks:
+        lease = work_queue.lease(worker_id, lease_seconds, max_attempts)
+        if lease is None:
+            if poll_interval is None:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"[{worker_id}] 租用URL: {lease.url} (第 {lease.attempts} 次尝试)")
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat():
+            while not stop.wait(heartbeat_interval):
+                if not work_queue.heartbeat(lease, lease_seconds):
+                    lost.set()
+                    logger.warning(f"[{worker_id}] 租约已失效: {lease.url}")
+                    return
+
+        heart = threading.Thread(target=beat, daemon=True)
+        heart.start()
+        blocked = 0
+        try:
+            while True:
+                if controller is not None:
+                    controller.acquire()
+                started = time.monotonic()
+                result = None
+                outcome = OUTCOME_ERROR
+                try:
+                    result = process(lease.url)
+                    error = '处理结果为空'
+                    outcome = OUTCOME_OK if result is not None else OUTCOME_ERROR
+                except Exception as e:
+                    error = e
+                    outcome = classify(e) if classify is not None else OUTCOME_ERROR
+                finally:
+                    if controller is not None:
+                        controller.release(outcome, time.monotonic() - started)
+                    if after_task is not None:
+                        after_task()
+                if (outcome == OUTCOME_BLOCKED and controller is not None
+                        and blocked + 1 < max_attempts and not lost.is_set()):
+                    blocked += 1
+                    logger.warning(f"[{worker_id}] 命中拦截页面，保留租约，等待熔断器冷却后重试: {lease.url}")
+                    continue
+                break
+        finally:
+            stop.set()
+            heart.join()
+
+        if result is None:
+            logger.error(f"[{worker_id}] 处理失败 {lease.url}: {error}")
+            work_queue.fail(lease, error, max_attempts)
+        elif work_queue.complete(lease, result):
+            logger.info(f"[{worker_id}] 结果已提交: {lease.url}")
+        else:
+            logger.warning(f"[{worker_id}] 租约已被其他worker接管，丢弃结果: {lease.url}")
+        done += 1
+    logger.info(f"[{worker_id}] worker结束，共处理 {done} 个URL")
+    return done
+
+
+def export_results(work_queue, output_dir='data/pulte', writer=None):
+    """把队列中已提交的结果写出为 json/pulte_{slug}.json"""
+    writer = writer or SyncWriter()
+    count = 0
+    for url, data in work_queue.results():
+        slug = url.rstrip('/').split('/')[-1]
+        writer.write_json(f"{output_dir}/json/pulte_{slug}.json", data)
+        count += 1
+    writer.flush()
+    logger.info(f"共导出 {count} 个结果到 {output_dir}/json")
+    return count
+
+
+def _stress_worker(path, worker_id, max_delay):
+    def process(url):
+        time.sleep(random.uniform(0, max_delay))
+        return {"url": url, "worker": worker_id}
+    return run_worker(SQLiteWorkQueue(path), process, worker_id)
+
+
+def stress_test(processes=4, count=200, max_delay=0.01):
+    """多进程自检：processes个进程共享一个临时SQLite队列，检查count个URL每个恰好提交一次"""
+    path = os.path.join(tempfile.mkdtemp(prefix='pulte_queue_'), 'queue.db')
+    work_queue = SQLiteWorkQueue(path)
+    urls = [f"https://www.pulte.com/homes/stress/test/city/community-{i}" for i in range(count)]
+    work_queue.enqueue(urls)
+    with multiprocessing.Pool(processes) as pool:
+        handled = pool.starmap(_stress_worker, [(path, f"stress-{i}", max_delay) for i in range(processes)])
+    results = dict(work_queue.results())
+    counts = work_queue.counts()
+    ok = sum(handled) == count and sorted(results) == sorted(urls) and counts == {STATE_DONE: count}
+    logger.info(f"自检{'通过' if ok else '失败'}: {processes} 个进程处理 {handled} = {sum(handled)} 次, "
+                f"提交 {len(results)}/{count} 个结果, 队列状态 {counts}, 数据库 {path}")
+    return ok
+
+
+def main():
+    """队列管理：enqueue / status / export / stress"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Manage the shared Pulte crawl queue')
+    parser.add_argument('command', choices=['enqueue', 'status', 'export', 'stress'])
+    parser.add_argument('--queue', default='sqlite:///data/pulte/queue.db', help='Queue URI')
+    parser.add_argument('--links', default='pulte_links.json', help='URL list to enqueue')
+    parser.add_argument('--output-dir', default='data/pulte', help='Where export writes JSON files')
+    parser.add_argument('--processes', type=int, default=4, help='Worker processes for the stress self-test')
+    parser.add_argument('--count', type=int, default=200, help='URLs for the stress self-test')
+    args = parser.parse_args()
+
+    if args.command == 'stress':
+        # 使用临时数据库，不影响--queue指定的队列
+        sys.exit(0 if stress_test(args.processes, args.count) else 1)
+    work_queue = open_queue(args.queue)
+    if args.command == 'enqueue':
+        with open(args.links, 'r', encoding='utf-8') as f:
+            work_queue.enqueue(json.load(f))
+    elif args.command == 'export':
+        export_results(work_queue, args.output_dir)
+    logger.info(f"队列状态: {work_queue.counts()}")
+
+
+if __name__ == "__main__":
+    main()
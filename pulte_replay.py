@@ -0,0 +1,200 @@
+import argparse
+import html
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = 'data/pulte/html'
+JSON_DIR = 'data/pulte/json'
+LINKS_FILE = 'pulte_links.json'
+
+# 回放时让Chrome只访问本地回放服务器，归档页面引用的外部图片/脚本一律解析失败
+OFFLINE_CHROME_ARGS = ['--host-resolver-rules=MAP * ~NOTFOUND, EXCLUDE 127.0.0.1, EXCLUDE localhost']
+
+BLOCK_PAGE = '<html><head><title>Access Denied</title></head><body>Access Denied</body></html>'
+
+
+def load_catalog(archive_dir=ARCHIVE_DIR, json_dir=JSON_DIR, links_file=LINKS_FILE):
+    """建立回放目录：URL最后一段 -> 归档HTML文件，以及可供发现的社区路径"""
+    pages = {}
+    if os.path.isdir(archive_dir):
+        for name in os.listdir(archive_dir):
+            if name.startswith('pulte_') and name.endswith('.html'):
+                pages[name[len('pulte_'):-len('.html')]] = os.path.join(archive_dir, name)
+
+    community_urls = []
+    if os.path.isdir(json_dir):
+        for name in sorted(os.listdir(json_dir)):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                        community_urls.append(json.load(f).get('url'))
+                except Exception as e:
+                    logger.error(f"读取 {name} 时出错: {str(e)}")
+    if os.path.exists(links_file):
+        with open(links_file, 'r', encoding='utf-8') as f:
+            community_urls.extend(json.load(f))
+
+    communities = []
+    for url in community_urls:
+        if not url:
+            continue
+        path = urlparse(url).path.rstrip('/')
+        if path.split('/')[-1] in pages and path not in communities:
+            communities.append(path)
+    logger.info(f"回放目录: {len(pages)} 个归档页面, {len(communities)} 个可发现的社区")
+    return pages, communities
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """用归档页面模拟pulte.com的本地HTTP服务器
+
+    - /                 合成首页，列出各州链接（供get_pulte_api_links发现）
+    - /homes/<state>    合成州页面，列出该州有归档的社区
+    - 其他路径          按URL最后一段返回 pulte_<slug>.html
+    支持固定延迟、随机抖动、错误注入和拦截页注入。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), archive_dir=ARCHIVE_DIR, json_dir=JSON_DIR,
+                 links_file=LINKS_FILE, latency=0.0, jitter=0.0, error_rate=0.0, block_rate=0.0,
+                 seed=None):
+        super().__init__(address, ReplayHandler)
+        self.pages, self.communities = load_catalog(archive_dir, json_dir, links_file)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.block_rate = block_rate
+        self.random = random.Random(seed)
+        self.requests = []  # (path, status, 服务端耗时)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def community_url(self, path):
+        return f"{self.base_url}{path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='pulte-replay', daemon=True)
+        self._thread.start()
+        logger.info(f"回放服务器已启动: {self.base_url}")
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def record(self, path, status, elapsed):
+        with self._lock:
+            self.requests.append((path, status, elapsed))
+
+    def delay(self):
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0
+        return max(self.latency + jitter, 0)
+
+    def inject(self):
+        """按配置的概率返回 'error' / 'block' / None"""
+        with self._lock:
+            roll = self.random.random()
+        if roll < self.error_rate:
+            return 'error'
+        if roll < self.error_rate + self.block_rate:
+            return 'block'
+        return None
+
+    def render(self, path):
+        """返回 (状态码, HTML)"""
+        path = path.rstrip('/') or '/'
+        if path == '/':
+            states = sorted({c.split('/')[2] for c in self.communities if len(c.split('/')) > 2})
+            items = ''.join(f'<li><a href="/homes/{s}">{html.escape(s)}</a></li>' for s in states)
+            return 200, f'<html><head><title>Pulte Replay</title></head><body><h1>Pulte Replay</h1><ul class="list-unstyled">{items}</ul></body></html>'
+        parts = path.split('/')
+        if len(parts) == 3 and parts[1] == 'homes':
+            cards = ''.join(
+                f'<div class="ProductSummary__headline"><a href="{c}">{html.escape(c.split("/")[-1])}</a></div>'
+                for c in self.communities if c.split('/')[2] == parts[2]
+            )
+            return 200, f'<html><head><title>{html.escape(parts[2])}</title></head><body><h1>{html.escape(parts[2])}</h1>{cards}</body></html>'
+        archived = self.pages.get(parts[-1])
+        if archived:
+            with open(archived, 'r', encoding='utf-8') as f:
+                return 200, f.read()
+        return 404, '<html><head><title>Not Found</title></head><body>Not Found</body></html>'
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = 'PulteReplay/1.0'
+
+    def do_GET(self):
+        started = time.monotonic()
+        path = urlparse(self.path).path
+        time.sleep(self.server.delay())
+        injected = self.server.inject()
+        if injected == 'error':
+            status, body = 503, '<html><body>Service Unavailable</body></html>'
+        elif injected == 'block':
+            status, body = 200, BLOCK_PAGE
+        else:
+            status, body = self.server.render(path)
+        payload = body.encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.server.record(path, status, time.monotonic() - started)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def main():
+    """独立运行回放服务器"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Serve archived Pulte pages for offline crawling')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--archive-dir', default=ARCHIVE_DIR)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Uniform +/- jitter added to latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--block-rate', type=float, default=0.0, help='Fraction of requests answered with a block page')
+    args = parser.parse_args()
+
+    server = ReplayServer((args.host, args.port), args.archive_dir, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, block_rate=args.block_rate)
+    logger.info(f"回放服务器: {server.base_url} (PULTE_BASE_URL={server.base_url})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+from datetime import datetime
+
+from pulte_writer import atomic_write, dump_json
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FILE = 'data/pulte/crawl_history.json'
+# 没有变化记录时假设的先验：每30天变化一次
+PRIOR_CHANGES = 1
+PRIOR_DAYS = 30
+# 已售罄（没有homesite）且从未变化的社区，至少间隔多少天再访问
+SOLD_OUT_MIN_INTERVAL_DAYS = 14
+# 没有历史记录时估计的单页抓取耗时，秒
+DEFAULT_PAGE_COST = 15
+# 连续失败后的退避：第n次连续失败后至少等待 FAILURE_BACKOFF_HOURS * 2^(n-1) 小时，最长不超过上限
+FAILURE_BACKOFF_HOURS = 6
+FAILURE_BACKOFF_MAX_DAYS = 7
+
+
+def community_slug(url):
+    """社区URL的最后一段，与输出文件名一致"""
+    return url.rstrip('/').split('/')[-1]
+
+
+def content_hash(data):
+    """数据内容的哈希，忽略抓取时间戳"""
+    payload = {k: v for k, v in data.items() if k != 'timestamp'}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _days_between(earlier, later):
+    return max((later - earlier).total_seconds() / 86400, 0)
+
+
+class CrawlHistory:
+    """每个社区的抓取历史：最后抓取、最后变化、homesite数量和抓取耗时"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+                logger.info(f"载入 {len(self.entries)} 条抓取历史: {path}")
+            except Exception as e:
+                logger.error(f"读取抓取历史失败 {path}: {str(e)}")
+
+    def save(self):
+        with self._lock:
+            atomic_write(self.path, dump_json(self.entries))
+        logger.info(f"抓取历史已保存到: {self.path}")
+
+    def _entry(self, url, now):
+        entry = self.entries.setdefault(community_slug(url), {
+            "url": url,
+            "first_fetch": now.isoformat(),
+            "last_fetch": None,
+            "last_change": None,
+            "last_attempt": None,
+            "fetches": 0,
+            "changes": 0,
+            "failures": 0,
+            "consecutive_failures": 0,
+            "homesites": None,
+            "fetch_cost": None,
+            "content_hash": None
+        })
+        entry["url"] = url
+        entry["last_attempt"] = now.isoformat()
+        return entry
+
+    def record(self, url, data, elapsed, now=None):
+        """记录一次抓取结果，data为None表示抓取失败"""
+        now = now or datetime.now()
+        with self._lock:
+            entry = self._entry(url, now)
+            if data is None:
+                entry["failures"] += 1
+                entry["consecutive_failures"] = entry.get("consecutive_failures", 0) + 1
+                return
+            entry["consecutive_failures"] = 0
+            pages = 1 + len(data.get('homesites') or [])
+            page_cost = elapsed / pages
+            entry["fetch_cost"] = page_cost if entry["fetch_cost"] is None else 0.5 * page_cost + 0.5 * entry["fetch_cost"]
+            digest = content_hash(data)
+            if entry["content_hash"] is not None and digest != entry["content_hash"]:
+                entry["changes"] += 1
+                entry["last_change"] = now.isoformat()
+            elif entry["content_hash"] is None:
+                entry["last_change"] = now.isoformat()
+            entry["content_hash"] = digest
+            entry["fetches"] += 1
+            entry["last_fetch"] = now.isoformat()
+            entry["homesites"] = len(data.get('homesites') or [])
+
+    def record_empty(self, url, elapsed, now=None):
+        """记录一次空页面（已售罄/没有户型和homesite）
+
+        已有数据不会被覆盖，内容哈希也不变；但这是一次成功的访问，记为没有库存，
+        之后按SOLD_OUT_MIN_INTERVAL_DAYS间隔重访，而不是每轮都当作新社区排在最前面。
+        """
+        now = now or datetime.now()
+        with self._lock:
+            entry = self._entry(url, now)
+            entry["consecutive_failures"] = 0
+            entry["fetch_cost"] = elapsed if entry["fetch_cost"] is None else 0.5 * elapsed + 0.5 * entry["fetch_cost"]
+            entry["fetches"] += 1
+            entry["last_fetch"] = now.isoformat()
+            entry["homesites"] = 0
+
+    def backing_off(self, entry, now):
+        """连续失败的社区是否仍在退避期内"""
+        failures = entry.get("consecutive_failures") or 0
+        if not failures or not entry.get("last_attempt"):
+            return False
+        hours = min(FAILURE_BACKOFF_HOURS * 2 ** (failures - 1), FAILURE_BACKOFF_MAX_DAYS * 24)
+        return _days_between(datetime.fromisoformat(entry["last_attempt"]), now) < hours / 24
+
+    def priority(self, entry, now):
+        """社区的刷新优先级：预计发生变化的概率 x 库存权重 / 单页耗时"""
+        last_fetch = datetime.fromisoformat(entry["last_fetch"])
+        first_fetch = datetime.fromisoformat(entry.get("first_fetch") or entry["last_fetch"])
+        staleness = _days_between(last_fetch, now)
+        observed = _days_between(first_fetch, last_fetch)
+        change_rate = (entry.get("changes", 0) + PRIOR_CHANGES) / (observed + PRIOR_DAYS)
+        if not entry.get("homesites") and not entry.get("changes"):
+            if staleness < SOLD_OUT_MIN_INTERVAL_DAYS:
+                return 0
+        if self.backing_off(entry, now):
+            return 0
+        p_changed = 1 - math.exp(-change_rate * staleness)
+        inventory = 1 + math.log1p(entry.get("homesites") or 0)
+        cost = entry.get("fetch_cost") or DEFAULT_PAGE_COST
+        # 之前成功过、最近连续失败的社区，每多失败一次优先级减半
+        return p_changed * inventory / cost / 2 ** (entry.get("consecutive_failures") or 0)
+
+    def plan(self, urls, page_budget=None, now=None):
+        """按优先级排列刷新队列，返回不超过页面预算的URL列表
+
+        没有历史记录的社区排在最前面；从未成功、只有失败记录的社区不算新社区，
+        退避期内跳过，退避期过后排在所有有分数的社区之后，失败少的优先。
+        每个社区消耗1 + homesite数量个页面。
+        严格按优先级取，遇到放不下的社区即停止，不用后面更便宜的社区填空；
+        排在第一位的社区即使超出预算也会抓取，大库存社区不会因此永远轮不到。
+        """
+        now = now or datetime.now()
+        known_pages = [1 + (e.get("homesites") or 0) for e in self.entries.values() if e.get("last_fetch")]
+        default_pages = round(sum(known_pages) / len(known_pages)) if known_pages else 1
+        unseen = []
+        scored = []
+        retries = []
+        for url in urls:
+            entry = self.entries.get(community_slug(url))
+            if not entry:
+                unseen.append(url)
+                continue
+            if not entry.get("last_fetch"):
+                if not self.backing_off(entry, now):
+                    retries.append((entry.get("failures", 0), url))
+                continue
+            score = self.priority(entry, now)
+            if score > 0:
+                scored.append((score, url, 1 + (entry.get("homesites") or 0)))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        retries.sort(key=lambda item: item[0])
+
+        queue = []
+        used = 0
+        for url, pages in ([(u, default_pages) for u in unseen] + [(u, p) for _, u, p in scored]
+                           + [(u, default_pages) for _, u in retries]):
+            if page_budget is not None and queue and used + pages > page_budget:
+                break
+            queue.append(url)
+            used += pages
+        logger.info(f"刷新计划: {len(queue)}/{len(urls)} 个社区, 预计 {used} 个页面"
+                    f" (新社区 {len(unseen)} 个, 失败重试 {len(retries)} 个, 预算 {page_budget if page_budget is not None else '不限'})")
+        return queue
@@ -0,0 +1,217 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# 一次扫描找出所有<script>块
+SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.S | re.I)
+# JSON-LD脚本块
+LD_JSON_RE = re.compile(r'<script\b[^>]*ld\+json[^>]*>(.*?)</script\s*>', re.S | re.I)
+# 已知的数据载体：户型事件、dataLayer、分析数据中的产品信息和社区地图标记。
+# 只在这些位置解码JSON；打包的库代码、全站地区地图等大脚本不再逐个尝试解析
+DATA_CARRIERS = (
+    'appEventData',
+    'dataLayer',
+    'Analytics.user',
+    'GlobalMapsObj.communitiesDirectionsMarkers',
+    'GlobalMapsObj.nearbyMarkers',
+)
+# 载体名之后的JSON起点：name.push({...}) 或 name = {...}
+CARRIER_TAIL_RE = re.compile(r'\s*(?:\.push\(|=(?!=))\s*([\[{])')
+# 超过该长度的数据块一般是打包后的库代码，不做JSON解析
+MAX_SCRIPT_LENGTH = 2 * 1024 * 1024
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+def _format_price(value):
+    try:
+        return f"${int(float(str(value).replace('$', '').replace(',', ''))):,}"
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ScriptDataIndex:
+    """页面内嵌JSON/JSON-LD数据的索引
+
+    每个页面只扫描一次HTML：解析JSON-LD块和CARRIER_RE列出的已知数据载体，
+    并按键名（不区分大小写）建立 键 -> 所在对象 的索引，按文档顺序保存。
+    """
+
+    def __init__(self, html):
+        self.blobs = []   # (名称, 数据)，JSON-LD的名称为'ld+json'
+        self._keys = {}   # 小写键名 -> [(blob序号, 父对象, 是否位于多元素数组中)]
+        found = []        # (位置, 名称, 数据)
+        for match in LD_JSON_RE.finditer(html):
+            body = match.group(1).strip()
+            if not body or len(body) > MAX_SCRIPT_LENGTH:
+                continue
+            try:
+                found.append((match.start(), 'ld+json', _decoder.decode(body)))
+            except ValueError:
+                logger.debug("JSON-LD解析失败")
+        for name in DATA_CARRIERS:
+            found.extend(self._scan_carrier(html, name))
+        # 按文档顺序建立索引
+        found.sort(key=lambda item: item[0])
+        for _, name, data in found:
+            self._add(name, data)
+        logger.info(f"脚本数据索引: {len(self.blobs)} 个数据块, {len(self._keys)} 个键")
+
+    @staticmethod
+    def _scan_carrier(html, name):
+        """用str.find定位载体名，只在其后紧跟JSON时解码，返回 [(位置, 名称, 数据)]"""
+        found = []
+        pos = html.find(name)
+        while pos != -1:
+            next_pos = pos + len(name)
+            # 排除更长标识符的一部分，如 myDataLayer
+            if pos == 0 or not (html[pos - 1].isalnum() or html[pos - 1] in '_$'):
+                match = CARRIER_TAIL_RE.match(html, next_pos)
+                if match:
+                    try:
+                        data, end = _decoder.raw_decode(html, match.start(1))
+                    except ValueError:
+                        pass
+                    else:
+                        if end - match.start(1) <= MAX_SCRIPT_LENGTH:
+                            found.append((match.start(1), name, data))
+                        next_pos = end
+            pos = html.find(name, next_pos)
+        return found
+
+    def _add(self, name, data):
+        blob_no = len(self.blobs)
+        self.blobs.append((name, data))
+        stack = [(data, False)]
+        while stack:
+            node, in_collection = stack.pop()
+            if isinstance(node, dict):
+                children = []
+                for key, value in node.items():
+                    self._keys.setdefault(key.strip().lower(), []).append((blob_no, node, in_collection))
+                    if isinstance(value, (dict, list)):
+                        children.append((value, False))
+            elif isinstance(node, list):
+                multiple = len(node) > 1
+                children = [(item, multiple) for item in node if isinstance(item, (dict, list))]
+            else:
+                continue
+            # 逆序压栈，保证索引顺序与文档顺序一致
+            stack.extend(reversed(children))
+
+    def objects(self, key, name=None):
+        """包含key的对象，按文档顺序；name限定数据块名称（如'ld+json'）"""
+        return [node for blob_no, node, _ in self._keys.get(key.lower(), [])
+                if name is None or self.blobs[blob_no][0] == name]
+
+    def first(self, key, name=None, default=None):
+        """key第一次出现时的值（不是最后一次）"""
+        for node in self.objects(key, name):
+            for k, value in node.items():
+                if k.strip().lower() == key.lower() and value not in (None, ''):
+                    return value
+        return default
+
+    @staticmethod
+    def _get(node, *keys):
+        lowered = {k.strip().lower(): v for k, v in node.items()}
+        for key in keys:
+            if lowered.get(key.lower()) not in (None, ''):
+                return lowered[key.lower()]
+        return None
+
+    def coordinates(self, community_id=None, strict=False):
+        """返回(latitude, longitude)
+
+        优先取Id与community_id一致的对象；strict为False时依次退回到JSON-LD的geo、
+        其余单独出现的经纬度对象。多元素数组里的经纬度（如全站地区地图）不会被采用。
+        """
+        candidates = []
+        for blob_no, node, in_collection in self._keys.get('latitude', []):
+            lat = _to_float(self._get(node, 'latitude'))
+            lng = _to_float(self._get(node, 'longitude'))
+            if lat is None or lng is None:
+                continue
+            node_id = self._get(node, 'id', 'communityid')
+            if community_id is not None and node_id is not None and str(node_id) == str(community_id):
+                return lat, lng
+            if not in_collection:
+                candidates.append((self.blobs[blob_no][0] != 'ld+json', lat, lng))
+        if strict or not candidates:
+            return None, None
+        # JSON-LD排在前面，其余保持文档顺序
+        candidates.sort(key=lambda c: c[0])
+        return candidates[0][1], candidates[0][2]
+
+    def address(self, community_id=None):
+        """返回 '街道, 城市, 州 邮编' 格式的地址，优先JSON-LD的PostalAddress"""
+        for node in self.objects('streetaddress', 'ld+json'):
+            parts = [self._get(node, 'streetAddress'), self._get(node, 'addressLocality')]
+            region = ' '.join(p for p in [self._get(node, 'addressRegion'), self._get(node, 'postalCode')] if p)
+            return ', '.join(p for p in parts + [region] if p)
+        if community_id is not None:
+            for node in self.objects('address'):
+                if str(self._get(node, 'id', 'communityid')) != str(community_id):
+                    continue
+                addr = self._get(node, 'address')
+                if isinstance(addr, dict):
+                    parts = [self._get(addr, 'street1'), self._get(addr, 'city')]
+                    region = ' '.join(p for p in [self._get(addr, 'state'), self._get(addr, 'zipcode')] if p)
+                    return ', '.join(p for p in parts + [region] if p)
+        return None
+
+    def location(self):
+        """城市/州/市场，来自页面的分析数据或JSON-LD地址"""
+        for node in self.objects('product'):
+            product = self._get(node, 'product')
+            if isinstance(product, dict) and self._get(product, 'city', 'state'):
+                return {
+                    "city": self._get(product, 'city'),
+                    "state": self._get(product, 'state'),
+                    "market": self._get(product, 'region'),
+                }
+        for node in self.objects('addresslocality', 'ld+json'):
+            return {
+                "city": self._get(node, 'addressLocality'),
+                "state": self._get(node, 'addressRegion'),
+                "market": None,
+            }
+        return {"city": None, "state": None, "market": None}
+
+    def price(self):
+        """社区起价，来自JSON-LD的priceRange"""
+        value = self.first('priceRange', 'ld+json')
+        if value:
+            match = re.search(r'\$[\d,]+', str(value))
+            return match.group(0) if match else None
+        return None
+
+    def plan_attributes(self):
+        """户型页面"Plan Viewed"事件中的价格/卧室/浴室/面积，缺失的键为None
+
+        只读取户型事件对象，避免误用页面上搜索筛选器之类数据中的同名键。
+        """
+        attributes = {"price": None, "beds": None, "baths": None, "sqft": None}
+        for node in self.objects('planinfo', 'appEventData'):
+            price = self._get(node, 'price')
+            if isinstance(price, dict):
+                price = self._get(price, 'sellingPrice', 'basePrice')
+            attributes["price"] = _format_price(price) if price is not None else None
+            # 与列表页提取的格式保持一致: "3 bd" / "2.5 ba" / "1,654 ft²"
+            beds = self._get(node, 'bedrooms', 'beds')
+            baths = self._get(node, 'bathrooms', 'baths')
+            sqft = _to_float(self._get(node, 'squarefeet', 'sqft'))
+            attributes["beds"] = f"{beds} bd" if beds is not None else None
+            attributes["baths"] = f"{baths} ba" if baths is not None else None
+            attributes["sqft"] = f"{int(sqft):,} ft²" if sqft is not None else None
+            break
+        return attributes
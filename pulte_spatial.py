@@ -0,0 +1,201 @@
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+
+from pulte_writer import SyncWriter
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+# 网格单元大小（度），约35英里见方，适合"附近几英里"这类查询
+GRID_CELL_DEGREES = 0.5
+NEARBY_COUNT = 5
+NEARBY_MAX_MILES = 25
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """两点之间的大圆距离（英里）"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """经纬度网格索引
+
+    点按 (纬度格, 经度格) 分桶；半径查询只检查与查询范围相交的格子，
+    再用haversine精确过滤。k近邻查询通过逐步扩大半径实现。
+    """
+
+    def __init__(self, cell_degrees=GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.size = 0
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def insert(self, lat, lng, item):
+        self.cells.setdefault(self._cell(lat, lng), []).append((lat, lng, item))
+        self.size += 1
+
+    def radius(self, lat, lng, miles):
+        """半径内的所有点，返回按距离排序的 [(距离, item)]"""
+        dlat = miles / MILES_PER_DEGREE_LAT
+        # 经度1度的长度随纬度变小，取查询范围内最靠近两极处的纬度计算
+        max_lat = min(89.9, abs(lat) + dlat)
+        dlng = min(180.0, miles / (MILES_PER_DEGREE_LAT * math.cos(math.radians(max_lat))))
+        row_min, col_min = self._cell(lat - dlat, lng - dlng)
+        row_max, col_max = self._cell(lat + dlat, lng + dlng)
+        results = []
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                for p_lat, p_lng, item in self.cells.get((row, col), ()):
+                    distance = haversine_miles(lat, lng, p_lat, p_lng)
+                    if distance <= miles:
+                        results.append((distance, item))
+        results.sort(key=lambda r: r[0])
+        return results
+
+    def nearest(self, lat, lng, k, max_miles=None, exclude=None):
+        """最近的k个点，返回 [(距离, item)]；exclude为需要排除的item判断函数"""
+        miles = self.cell_degrees * MILES_PER_DEGREE_LAT
+        limit = max_miles if max_miles is not None else math.pi * EARTH_RADIUS_MILES
+        while True:
+            miles = min(miles, limit)
+            found = [r for r in self.radius(lat, lng, miles) if exclude is None or not exclude(r[1])]
+            if len(found) >= k or miles >= limit:
+                return found[:k]
+            miles *= 2
+
+
+def load_points(json_dir='data/pulte/json'):
+    """读取所有社区JSON，返回 (社区列表, homesite列表)，只保留有坐标的记录"""
+    communities, homesites = [], []
+    for name in sorted(os.listdir(json_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(json_dir, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"读取 {name} 时出错: {str(e)}")
+            continue
+        location = data.get('location') or {}
+        if location.get('latitude') is not None and location.get('longitude') is not None:
+            communities.append({
+                "file": name,
+                "name": data.get('name'),
+                "url": data.get('url'),
+                "latitude": float(location['latitude']),
+                "longitude": float(location['longitude']),
+            })
+        for homesite in data.get('homesites') or []:
+            if homesite.get('latitude') is None or homesite.get('longitude') is None:
+                continue
+            homesites.append({
+                "file": name,
+                "id": homesite.get('id'),
+                "name": homesite.get('name'),
+                "price": homesite.get('price'),
+                "status": homesite.get('status'),
+                "url": homesite.get('url'),
+                "latitude": float(homesite['latitude']),
+                "longitude": float(homesite['longitude']),
+            })
+    logger.info(f"载入 {len(communities)} 个社区和 {len(homesites)} 个homesite的坐标")
+    return communities, homesites
+
+
+def build_index(points, cell_degrees=GRID_CELL_DEGREES):
+    index = GridIndex(cell_degrees)
+    for point in points:
+        index.insert(point["latitude"], point["longitude"], point)
+    return index
+
+
+def nearby_communities(index, community, k=NEARBY_COUNT, max_miles=NEARBY_MAX_MILES):
+    """与community相邻的社区，格式与nearbyplaces数组一致"""
+    found = index.nearest(community["latitude"], community["longitude"], k, max_miles,
+                          exclude=lambda other: other["file"] == community["file"])
+    return [{
+        "type": "community",
+        "name": other["name"],
+        "url": other["url"],
+        "latitude": other["latitude"],
+        "longitude": other["longitude"],
+        "distance_miles": round(distance, 2),
+    } for distance, other in found]
+
+
+def inventory_within(centers, homesite_index, miles):
+    """批量统计每个中心点X英里内的homesite数量和涉及的社区数，返回与centers对应的列表"""
+    results = []
+    for center in centers:
+        found = homesite_index.radius(center["latitude"], center["longitude"], miles)
+        results.append({
+            "homesites": len(found),
+            "available": sum(1 for _, h in found if (h.get("status") or '').lower() == 'available'),
+            "communities": len({h["file"] for _, h in found}),
+        })
+    return results
+
+
+def populate_nearbyplaces(json_dir='data/pulte/json', k=NEARBY_COUNT, max_miles=NEARBY_MAX_MILES, writer=None):
+    """为每个社区JSON填充nearbyplaces，只改写有变化的文件"""
+    communities, _ = load_points(json_dir)
+    index = build_index(communities)
+    writer = writer or SyncWriter()
+    changed = 0
+    for community in communities:
+        path = os.path.join(json_dir, community["file"])
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        nearby = nearby_communities(index, community, k, max_miles)
+        if data.get('nearbyplaces') != nearby:
+            data['nearbyplaces'] = nearby
+            writer.write_json(path, data)
+            changed += 1
+    writer.flush()
+    logger.info(f"更新了 {changed} 个社区的nearbyplaces")
+    return changed
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    parser = argparse.ArgumentParser(description='Spatial queries over scraped communities and homesites')
+    parser.add_argument('--json-dir', default='data/pulte/json')
+    parser.add_argument('--populate', action='store_true', help='Fill nearbyplaces with neighboring communities')
+    parser.add_argument('--k', type=int, default=NEARBY_COUNT, help='Neighbors per community')
+    parser.add_argument('--max-miles', type=float, default=NEARBY_MAX_MILES, help='Maximum neighbor distance')
+    parser.add_argument('--inventory-miles', type=float, help='Report homesite inventory within this many miles of each community')
+    parser.add_argument('--near', help='LAT,LNG to query instead of every community (with --inventory-miles)')
+    args = parser.parse_args()
+
+    if args.populate:
+        populate_nearbyplaces(args.json_dir, args.k, args.max_miles)
+    if args.inventory_miles:
+        communities, homesites = load_points(args.json_dir)
+        if args.near:
+            lat, lng = (float(v) for v in args.near.split(','))
+            centers = [{"name": args.near, "latitude": lat, "longitude": lng}]
+        else:
+            centers = communities
+        counts = inventory_within(centers, build_index(homesites), args.inventory_miles)
+        for center, count in zip(centers, counts):
+            print(f"{center['name']}\t{count['homesites']} homesites ({count['available']} available) "
+                  f"in {count['communities']} communities within {args.inventory_miles:g} mi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 单个URL的处理结果
+OUTCOME_OK = 'ok'            # 正常抓取到户型数据
+OUTCOME_SKIPPED = 'skipped'  # 结果已存在，未访问网站
+OUTCOME_EMPTY = 'empty'      # 页面缺少GlanceViewSection
+OUTCOME_TIMEOUT = 'timeout'  # 导航或社区超时
+OUTCOME_BLOCKED = 'blocked'  # 命中拦截/验证页面
+OUTCOME_ERROR = 'error'      # 其他异常
+
+FAILURE_OUTCOMES = (OUTCOME_EMPTY, OUTCOME_TIMEOUT, OUTCOME_BLOCKED, OUTCOME_ERROR)
+
+
+class CircuitBreaker:
+    """熔断器：连续失败或命中拦截页后暂停抓取
+
+    closed -> open（暂停cooldown秒）-> half_open（放行一个探测请求）
+    探测成功则恢复，失败则以加倍的冷却时间重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=300, max_cooldown=3600):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def trip(self, reason):
+        if self.state == self.HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        logger.error(f"熔断器打开({reason})，暂停抓取 {self.cooldown:.0f}s")
+
+    def record(self, outcome):
+        if outcome in FAILURE_OUTCOMES:
+            self.consecutive_failures += 1
+            if outcome == OUTCOME_BLOCKED:
+                self.trip('命中拦截页面')
+            elif self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.trip(f'连续失败 {self.consecutive_failures} 次')
+        elif outcome == OUTCOME_OK:
+            if self.state != self.CLOSED:
+                logger.info("探测请求成功，熔断器关闭")
+            self.state = self.CLOSED
+            self.cooldown = self.base_cooldown
+            self.consecutive_failures = 0
+
+    def wait_time(self):
+        """距离可以放行请求还需等待的秒数"""
+        if self.state != self.OPEN:
+            return 0
+        remaining = self.cooldown - (time.monotonic() - self.opened_at)
+        if remaining <= 0:
+            self.state = self.HALF_OPEN
+            logger.info("熔断器进入半开状态，放行一个探测请求")
+            return 0
+        return remaining
+
+
+class AdaptiveController:
+    """自适应并发控制器（AIMD）
+
+    延迟和成功率健康时每完成一轮（等于当前并发数的成功请求）并发加一；
+    出现超时、拦截或空页面时并发减半并指数退避，严重时由熔断器暂停。
+    """
+
+    def __init__(self, min_concurrency=1, max_concurrency=4, initial_concurrency=1,
+                 target_latency=120, min_success_rate=0.8, window=20,
+                 min_delay=2, max_backoff=120, breaker=None):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.limit = max(min_concurrency, min(initial_concurrency, max_concurrency))
+        self.target_latency = target_latency
+        self.min_success_rate = min_success_rate
+        self.min_delay = min_delay
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.outcomes = deque(maxlen=window)
+        self.latency_ewma = None
+        self.running = 0
+        self.backoff_until = 0
+        self.consecutive_failures = 0
+        self.successes_since_increase = 0
+        self.last_dispatch = 0
+        self.stats = {}
+        self._cond = threading.Condition()
+
+    def success_rate(self):
+        considered = [o for o in self.outcomes if o != OUTCOME_SKIPPED]
+        if not considered:
+            return 1.0
+        return sum(1 for o in considered if o == OUTCOME_OK) / len(considered)
+
+    def healthy(self):
+        latency_ok = self.latency_ewma is None or self.latency_ewma <= self.target_latency
+        return latency_ok and self.success_rate() >= self.min_success_rate
+
+    def acquire(self):
+        """阻塞直到允许发起新的抓取"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                waits = [
+                    self.breaker.wait_time(),
+                    self.backoff_until - now,
+                    self.last_dispatch + self.min_delay - now,
+                ]
+                limit = 1 if self.breaker.state == CircuitBreaker.HALF_OPEN else self.limit
+                wait = max(waits)
+                if wait <= 0 and self.running < limit:
+                    self.running += 1
+                    self.last_dispatch = now
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, outcome, latency):
+        """记录一次抓取结果并调整并发"""
+        with self._cond:
+            self.running -= 1
+            self.stats[outcome] = self.stats.get(outcome, 0) + 1
+            self.breaker.record(outcome)
+            if outcome != OUTCOME_SKIPPED:
+                self.outcomes.append(outcome)
+                self.latency_ewma = latency if self.latency_ewma is None else 0.3 * latency + 0.7 * self.latency_ewma
+
+            if outcome in FAILURE_OUTCOMES:
+                self.consecutive_failures += 1
+                self.successes_since_increase = 0
+                old_limit = self.limit
+                self.limit = max(self.min_concurrency, self.limit // 2)
+                backoff = min(self.min_delay * (2 ** self.consecutive_failures), self.max_backoff)
+                self.backoff_until = time.monotonic() + backoff
+                logger.warning(f"抓取结果 {outcome}，并发 {old_limit} -> {self.limit}，退避 {backoff:.0f}s")
+            elif outcome == OUTCOME_OK:
+                self.consecutive_failures = 0
+                self.successes_since_increase += 1
+                if (self.healthy() and self.limit < self.max_concurrency
+                        and self.successes_since_increase >= self.limit):
+                    self.limit += 1
+                    self.successes_since_increase = 0
+                    logger.info(f"延迟 {self.latency_ewma:.1f}s, 成功率 {self.success_rate():.0%}，并发提升到 {self.limit}")
+                elif not self.healthy() and self.limit > self.min_concurrency:
+                    self.limit -= 1
+                    logger.info(f"延迟 {self.latency_ewma:.1f}s 偏高，并发降低到 {self.limit}")
+            self._cond.notify_all()
+
+
+def run_adaptive_batch(urls, fetch, controller=None):
+    """在自适应控制器下并发处理URL列表
+
+    fetch(url)需要返回上面定义的OUTCOME_*之一。返回各结果的计数。
+    """
+    controller = controller or AdaptiveController()
+    pending = deque(enumerate(urls, 1))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                index, url = pending.popleft()
+            controller.acquire()
+            started = time.monotonic()
+            outcome = OUTCOME_ERROR
+            try:
+                logger.info(f"正在处理第 {index}/{len(urls)} 个URL (并发上限 {controller.limit})")
+                outcome = fetch(url)
+            except Exception as e:
+                logger.error(f"处理URL失败 {url}: {str(e)}")
+            finally:
+                controller.release(outcome, time.monotonic() - started)
+
+    threads = [threading.Thread(target=worker, name=f'pulte-fetch-{i}', daemon=True)
+               for i in range(controller.max_concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    logger.info(f"批量处理完成: {controller.stats}")
+    return controller.stats
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import Future
+
+try:
+    import orjson
+except ImportError:  # orjson是可选依赖，没有时使用标准库json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 写入队列的默认容量，队列满时抓取线程会阻塞等待（背压）
+WRITER_QUEUE_SIZE = 16
+# 临时文件前缀，便于启动时清理中断遗留的半成品
+TEMP_PREFIX = '.pulte-tmp-'
+
+# 进程的umask，只能通过设置再恢复的方式读取，因此在导入时（尚未启动线程）读取一次
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def dump_json(data, compact=False, fast=True):
+    """序列化JSON为UTF-8字节串"""
+    if fast and orjson is not None:
+        option = 0 if compact else orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    if compact:
+        text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    else:
+        text = json.dumps(data, indent=2, ensure_ascii=False)
+    return text.encode('utf-8')
+
+
+def atomic_write(path, content):
+    """原子写入：先写同目录临时文件，再rename覆盖目标文件
+
+    中途崩溃只会留下临时文件，目标文件要么是旧内容要么是完整的新内容。
+    mkstemp创建的文件权限是0600，rename前改为目标文件原有的权限，新文件则与open()一致（0666 & ~umask）。
+    """
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = 0o666 & ~_UMASK
+    fd, tmp_path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def cleanup_partial_writes(directory):
+    """删除中断写入遗留的临时文件"""
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    for name in os.listdir(directory):
+        if name.startswith(TEMP_PREFIX):
+            try:
+                os.remove(os.path.join(directory, name))
+                removed += 1
+            except OSError:
+                pass
+    if removed:
+        logger.info(f"清理 {removed} 个未完成的临时文件: {directory}")
+    return removed
+
+
+def _done(path):
+    future = Future()
+    future.set_result(path)
+    return future
+
+
+class SyncWriter:
+    """同步写入，在调用线程中直接原子写文件
+
+    write_text/write_json返回Future，结果为文件路径；同步写入失败时直接抛出异常。
+    """
+
+    def __init__(self, compact=False, fast_json=True):
+        self.compact = compact
+        self.fast_json = fast_json
+
+    def write_text(self, path, text):
+        atomic_write(path, text)
+        logger.info(f"文件已保存到: {path}")
+        return _done(path)
+
+    def write_json(self, path, data):
+        atomic_write(path, dump_json(data, self.compact, self.fast_json))
+        logger.info(f"数据已保存到: {path}")
+        return _done(path)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class OutputWriter(SyncWriter):
+    """后台写入阶段
+
+    抓取线程只负责把内容放入有界队列，由独立线程完成序列化和原子写入。
+    每次提交返回一个Future，写入失败时其中带有异常；需要确认结果落盘的调用方
+    （例如更新抓取历史和变化事件之前）调用result()等待，其余写入的失败计入errors。
+    """
+
+    def __init__(self, max_queue=WRITER_QUEUE_SIZE, compact=False, fast_json=True):
+        super().__init__(compact, fast_json)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.errors = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name='pulte-writer', daemon=True)
+        self._thread.start()
+
+    def write_text(self, path, text):
+        future = Future()
+        self._queue.put(('text', path, text, future))
+        return future
+
+    def write_json(self, path, data):
+        future = Future()
+        self._queue.put(('json', path, data, future))
+        return future
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                kind, path, payload, future = item
+                if kind == 'json':
+                    super().write_json(path, payload)
+                else:
+                    super().write_text(path, payload)
+                self.written += 1
+                future.set_result(path)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"写入文件时出错 {item[1]}: {str(e)}")
+                future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """等待队列中已提交的内容全部写完"""
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        logger.info(f"写入阶段结束: 成功 {self.written} 个文件, 失败 {self.errors} 个")